@@ -0,0 +1,50 @@
+import datetime
+
+import pytest
+import pytz
+
+from productivity.datetime_interval import DatetimeInterval
+from productivity.interval_set import IntervalSet
+from synthetic import AVERAGE_MINUTES_BETWEEN_EVENTS, synthetic_events
+
+SIZES = [10, 1000, 100000]
+START = pytz.UTC.localize(datetime.datetime(2000, 1, 1))
+
+
+def period(size):
+    return DatetimeInterval(START, START + datetime.timedelta(minutes=size * AVERAGE_MINUTES_BETWEEN_EVENTS))
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_simplify(benchmark, size):
+    events = synthetic_events(size, START)
+    benchmark(DatetimeInterval.simplify, events)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_subtract(benchmark, size):
+    events = synthetic_events(size, START)
+    benchmark(period(size).subtract, events)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_intersect(benchmark, size):
+    events = synthetic_events(size, START)
+    other_events = synthetic_events(size, START, seed=1)
+
+    def intersect_pairwise():
+        return [event.intersect(other_event) for event, other_event in zip(events, other_events)]
+    benchmark(intersect_pairwise)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_interval_set_intersection(benchmark, size):
+    events = IntervalSet.from_intervals(synthetic_events(size, START))
+    other_events = IntervalSet.from_intervals(synthetic_events(size, START, seed=1))
+    benchmark(events.intersection, other_events)
+
+
+@pytest.mark.parametrize('size', SIZES)
+def bench_interval_set_complement(benchmark, size):
+    events = IntervalSet.from_intervals(synthetic_events(size, START))
+    benchmark(events.complement, period(size).start, period(size).end)
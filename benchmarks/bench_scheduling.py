@@ -0,0 +1,87 @@
+import datetime
+import io
+import random
+from unittest import mock
+
+from fake_google import FakeGoogle, fake_google_environment
+import pytest
+import pytz
+
+from productivity.availability import Availability
+from productivity.calendar_google import Calendar
+from productivity.config import AVAILABLE_TIMES_PER_WEEKDAY, GOOGLE_TASKS_INBOX_ID, TIMEZONE
+from productivity.console import Console
+from productivity.interval_set import IntervalSet
+from productivity.task import Task
+from synthetic import AVERAGE_MINUTES_BETWEEN_EVENTS, synthetic_events
+
+EVENT_COUNTS = [10, 1000, 100000]
+TASK_COUNTS = [10, 100, 1000, 10000]
+DAYS = 7
+
+
+def _start():
+    """
+    Returns: datetime.datetime: midnight of today in UTC. The events start here, so that they are synchronized.
+    """
+    now = datetime.datetime.now(tz=pytz.UTC)
+    return pytz.UTC.localize(datetime.datetime(now.year, now.month, now.day))
+
+
+@pytest.fixture(scope='module', params=EVENT_COUNTS)
+def calendar(request):
+    """
+    Returns: Calendar: synchronized with a fake calendar with synthetic events
+    """
+    fake = FakeGoogle()
+    for event in synthetic_events(request.param, _start()):
+        fake.add_event('Event', event.start, event.end)
+    with fake_google_environment(fake):
+        calendar = Calendar()
+        calendar.sync()
+        yield calendar
+
+
+def bench_whitespace(benchmark, calendar):
+    start = _start()
+    end = start + datetime.timedelta(minutes=len(calendar._event_store.timed_events(0, 2 ** 62))
+                                     * AVERAGE_MINUTES_BETWEEN_EVENTS)
+    benchmark(calendar.whitespace, start, end)
+
+
+def bench_determine_calendar_overlap_with_configured_times(benchmark, calendar):
+    console = Console.__new__(Console)
+    console._lazy_calendar = calendar
+    console._availability = Availability(AVAILABLE_TIMES_PER_WEEKDAY, TIMEZONE)
+    start = _start()
+    end = start + datetime.timedelta(days=DAYS)
+    desired_intervals = console._availability.intervals(start.date(), DAYS)
+    benchmark(console._determine_calendar_overlap_with_configured_times, start, end, desired_intervals)
+
+
+@pytest.mark.parametrize('task_count', TASK_COUNTS)
+def bench_schedule_in_whitespace(benchmark, task_count):
+    generator = random.Random(0)
+    console = Console.__new__(Console)
+    console._inbox = mock.Mock()
+    console._inbox.get_tasks.return_value = [
+        Task(str(index), 'Task #{}min'.format(generator.randrange(5, 61, 5))) for index in range(task_count)]
+
+    # free time between synthetic events, long enough for about half of the tasks
+    start = _start()
+    events = IntervalSet.from_intervals(synthetic_events(task_count, start))
+    whitespaces = events.complement(start, start + datetime.timedelta(minutes=task_count
+                                                                      * AVERAGE_MINUTES_BETWEEN_EVENTS))
+    benchmark(console._schedule_in_whitespace, whitespaces)
+
+
+@pytest.mark.parametrize('task_count', TASK_COUNTS[:3])
+def bench_inbox_to_calendar_dry_run(benchmark, task_count):
+    fake = FakeGoogle()
+    with fake_google_environment(fake):
+        for index in range(task_count):
+            fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {} #5min'.format(index))
+        with mock.patch('sys.stdout', io.StringIO()):
+            console = Console()
+            console._inbox.get_tasks()
+            benchmark(console.inbox_to_calendar, str(DAYS), ' dry')
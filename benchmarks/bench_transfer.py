@@ -0,0 +1,64 @@
+"""
+Benchmarks the first page of the list calls of the inbox and the calendar, with and without the fields masks of the
+calls. The calls are made with `_request` against the fake of Google, and the bytes of the responses are counted by
+the metrics of the calls, like in the `stats` command. They are in the `extra_info` of the benchmarks.
+
+The fake returns only some of the fields that Google returns, so the masks save more bytes against Google.
+"""
+import datetime
+
+from fake_google import fake_google_environment
+import pytest
+
+from productivity.calendar_google import Calendar
+from productivity.config import GOOGLE_TASKS_INBOX_ID
+from productivity.inbox_google import Inbox
+from productivity.metrics import metrics
+from synthetic import synthetic_events
+
+# list call -> class of the service, collection, fields mask and parameters of the call
+CALLS = {
+    'task_lists': (Inbox, 'tasklists', Inbox._LIST_PAGE_FIELDS, {'maxResults': Inbox._PAGE_SIZE}),
+    'tasks': (Inbox, 'tasks', Inbox._TASK_PAGE_FIELDS,
+              {'tasklist': GOOGLE_TASKS_INBOX_ID, 'maxResults': Inbox._PAGE_SIZE, 'showHidden': True}),
+    'events': (Calendar, 'events', Calendar._EVENT_PAGE_FIELDS,
+               {'calendarId': 'primary', 'maxResults': Calendar._PAGE_SIZE, 'singleEvents': True}),
+}
+
+
+@pytest.fixture(scope='module')
+def services():
+    """
+    Returns: dict(type, GoogleAPI): an inbox and a calendar on a fake with full pages of task lists, tasks and events
+    """
+    with fake_google_environment() as fake:  # makes the lists of the configuration, like the inbox
+        for index in range(10):
+            fake.add_task_list('list{}'.format(index), 'List {}'.format(index))
+        for index in range(100):
+            fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {} (30m)'.format(index),
+                          'completed' if index % 4 == 0 else 'needsAction')
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        for index, event in enumerate(synthetic_events(250, start)):
+            fake.add_event('Event {}'.format(index), event.start, event.end)
+        inbox = Inbox()
+        inbox.get_tasks()  # waits for the first load, which is not measured
+        yield {Inbox: inbox, Calendar: Calendar()}
+
+
+@pytest.mark.parametrize('name', sorted(CALLS))
+@pytest.mark.parametrize('masked', [False, True], ids=['full', 'masked'])
+def bench_list_call(benchmark, services, name, masked):
+    service_class, collection, fields, parameters = CALLS[name]
+    api = services[service_class]
+
+    method = api._request(collection, 'list', fields, **parameters).methodId  # the name in the metrics
+
+    def call():
+        request = api._request(collection, 'list', fields if masked else None, **parameters)
+        # not `_execute`, which would make the call conditional so that the fake sends the page only once
+        return api._execute_once(request, method, 1)
+
+    metrics.reset()
+    benchmark(call)
+    statistics = metrics.snapshot()[method]
+    benchmark.extra_info['bytes_received'] = statistics['bytes_received'] // statistics['count']
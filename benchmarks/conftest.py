@@ -0,0 +1,5 @@
+import os.path
+import sys
+
+# the fake of Google is shared with the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'tests'))
@@ -0,0 +1,26 @@
+import datetime
+import random
+
+from productivity.datetime_interval import DatetimeInterval
+
+AVERAGE_MINUTES_BETWEEN_EVENTS = 90
+
+
+def synthetic_events(size, start, seed=0):
+    """
+    Args:
+        size (int): the number of events
+        start (datetime.datetime): the start of the first possible event
+        seed (int, optional): seed of the random events
+
+    Returns: list(DatetimeInterval): events of 15 minutes to 2 hours in random order, on average one event per
+        `AVERAGE_MINUTES_BETWEEN_EVENTS`, so that some events overlap
+    """
+    generator = random.Random(seed)
+    period_minutes = size * AVERAGE_MINUTES_BETWEEN_EVENTS
+    events = []
+    for _ in range(size):
+        event_start = start + datetime.timedelta(minutes=generator.randrange(period_minutes))
+        events.append(DatetimeInterval(event_start,
+                                       event_start + datetime.timedelta(minutes=generator.randrange(15, 121, 15))))
+    return events
@@ -0,0 +1,107 @@
+import datetime
+import re
+
+import numpy as np
+import pytz
+
+from productivity.constants import WEEKDAY_TO_INT
+from productivity.interval_set import IntervalSet
+
+_TIME_PATTERN = re.compile(r'^([0-9]{2})([0-9]{2})$')
+_MICROSECONDS_PER_MINUTE = 60 * 10 ** 6
+_MICROSECONDS_PER_DAY = 24 * 60 * _MICROSECONDS_PER_MINUTE
+
+
+class Availability:
+    """
+    Available times per weekday, compiled once from the configuration into offsets from local midnight.
+
+    Times that don't exist on a day because of a change to daylight saving time are moved forward by the length of
+    the change. Times that occur twice on a day because of a change from daylight saving time are taken the second
+    time.
+    """
+
+    def __init__(self, times_per_weekday, timezone):
+        """
+        Args:
+            times_per_weekday (dict(str, list(tuple(str, str)))): the available times per weekday, like
+                `AVAILABLE_TIMES_PER_WEEKDAY` in the configuration. Times are formatted as 'HHMM'.
+            timezone (str): the timezone of the available times
+
+        Raises:
+            ValueError: if a weekday or time is invalid, or if available times of a weekday overlap
+        """
+        self._timezone = pytz.timezone(timezone)
+        self._starts = [np.zeros(0, dtype=np.int64) for _ in WEEKDAY_TO_INT]  # microseconds after midnight
+        self._ends = [np.zeros(0, dtype=np.int64) for _ in WEEKDAY_TO_INT]
+        for weekday, times in times_per_weekday.items():
+            if weekday not in WEEKDAY_TO_INT:
+                raise ValueError('weekday {} should be in {}'.format(weekday, list(WEEKDAY_TO_INT.keys())))
+            intervals = sorted((self._parse_time(start), self._parse_time(end)) for start, end in times)
+            for (start, end), (next_start, _) in zip(intervals, intervals[1:] + [(None, None)]):
+                if start >= end:
+                    raise ValueError('available time on {} starts at or after it ends'.format(weekday))
+                if next_start is not None and next_start < end:
+                    raise ValueError('available times on {} overlap'.format(weekday))
+            self._starts[WEEKDAY_TO_INT[weekday]] = np.array([start for start, _ in intervals], dtype=np.int64)
+            self._ends[WEEKDAY_TO_INT[weekday]] = np.array([end for _, end in intervals], dtype=np.int64)
+
+    @staticmethod
+    def _parse_time(time_string):
+        match = _TIME_PATTERN.match(time_string) if isinstance(time_string, str) else None
+        if not match:
+            raise ValueError("available time {!r} should be formatted as 'HHMM'".format(time_string))
+        hours, minutes = int(match.group(1)), int(match.group(2))
+        if minutes >= 60 or hours > 24 or (hours == 24 and minutes):
+            raise ValueError('available time {!r} is not a time of the day'.format(time_string))
+        return (hours * 60 + minutes) * _MICROSECONDS_PER_MINUTE
+
+    def intervals(self, start_date, days):
+        """
+        Args:
+            start_date (datetime.date): the first day
+            days (int): the number of days
+
+        Returns: IntervalSet: the available times in UTC
+        """
+        day_numbers = np.arange(days, dtype=np.int64)
+        first_midnight = IntervalSet.to_epoch(datetime.datetime.combine(start_date, datetime.time()), aware=False)
+        midnights = first_midnight + day_numbers * _MICROSECONDS_PER_DAY  # local time, as if it were UTC
+        weekdays = (start_date.weekday() + day_numbers) % 7
+
+        local_starts = np.concatenate([
+            (midnights[weekdays == weekday][:, None] + self._starts[weekday][None, :]).ravel() for weekday in range(7)
+        ])
+        local_ends = np.concatenate([
+            (midnights[weekdays == weekday][:, None] + self._ends[weekday][None, :]).ravel() for weekday in range(7)
+        ])
+        utc_offsets = self._utc_offsets(start_date, days)
+        return IntervalSet(self._to_utc(local_starts, first_midnight, utc_offsets),
+                           self._to_utc(local_ends, first_midnight, utc_offsets))
+
+    def _utc_offsets(self, start_date, days):
+        """
+        Returns: numpy.ndarray: the UTC offset in microseconds at local midnight, for the days and the day after
+        """
+        first_midnight = datetime.datetime.combine(start_date, datetime.time())
+        return np.array([
+            self._utc_offset(first_midnight + datetime.timedelta(days=day))
+            for day in range(days + 2)  # an available time can end at midnight of the day after
+        ], dtype=np.int64)
+
+    def _utc_offset(self, local_time):
+        """
+        Returns: int: the UTC offset in microseconds at a local time
+        """
+        return self._timezone.localize(local_time, is_dst=False).utcoffset() // datetime.timedelta(microseconds=1)
+
+    def _to_utc(self, local_times, first_midnight, utc_offsets):
+        day_numbers = (local_times - first_midnight) // _MICROSECONDS_PER_DAY
+        utc_times = local_times - utc_offsets[day_numbers]
+
+        # on days on which the UTC offset changes, the offset depends on the time of the day
+        offset_changes = utc_offsets[day_numbers] != utc_offsets[day_numbers + 1]
+        for index in np.flatnonzero(offset_changes):
+            local_time = datetime.datetime(1970, 1, 1) + datetime.timedelta(microseconds=int(local_times[index]))
+            utc_times[index] = local_times[index] - self._utc_offset(local_time)
+        return utc_times
@@ -1,8 +1,12 @@
 import datetime
 
-import pytz
+import numpy as np
+from googleapiclient.errors import HttpError
 
-from productivity.datetime_interval import DatetimeInterval
+from productivity.config import FREE_BUSY_CALENDAR_IDS
+from productivity.constants import EVENT_STORE_FILE
+from productivity.interval_set import IntervalSet
+from productivity.local_store import EventStore
 from productivity.task import Task
 from productivity.google_api import GoogleAPI
 
@@ -12,15 +16,22 @@ class Calendar(GoogleAPI):
     _RFC_3339_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.0Z'  # used in Google Calendar API list events
     _YMD_DATE_FORMAT = '%Y-%m-%d'  # used for setting an all-day event in Google Calendar API
     _QUERY_DAYS = 60
+    _PAGE_SIZE = 2500  # maximum page size of the Google Calendar API
+    _SYNC_TOKEN_EXPIRED_STATUS = 410  # Google Calendar API responds with 410 Gone when a full sync is required
+    _EVENT_PAGE_FIELDS = 'nextPageToken,nextSyncToken,items(id,status,summary,start(date,dateTime),end(date,dateTime))'
 
     def __init__(self):
-        self._setup_credentials()
-        self._setup_service('calendar', 'v3')
-
-    def schedule_event(self, title, start_datetime, end_datetime=None):
+        # the primary calendar is of the account of `credentials/token.json`, free/busy can use other accounts too
+        accounts = [None] + sorted({calendar_id[0] for calendar_id in FREE_BUSY_CALENDAR_IDS or []
+                                    if isinstance(calendar_id, tuple)})
+        self._setup_credentials(accounts)
+        self._setup_service('calendar', 'v3', accounts)
+        self._event_store = EventStore(EVENT_STORE_FILE)
+
+    def schedule_event(self, title, start_datetime, end_datetime=None, on_success=None, on_error=None):
         """
         Schedule an event on a date with a title. This function can be used to schedule all-day events and events
-        with a start- and end-date.
+        with a start- and end-date. The event is sent to Google Calendar in the background.
 
         Args:
             title (string): the title of the event
@@ -30,7 +41,33 @@ class Calendar(GoogleAPI):
             end_datetime (datetime.datetime, optional): end datetime of the event, assumed to be in UTC.
                 If end_datetime is given, then the event is scheduled from start_datetime until end_datetime.
                 If end_datetime is not provided, then the event is scheduled as an all-day event.
+            on_success (callable, optional): called with the event once it has been scheduled, on a background thread
+            on_error (callable, optional): called with the error if the event could not be scheduled
+        """
+        event = self._event_body(title, start_datetime, end_datetime)
+        # TODO: notification time defaults to 23:30 because of internal defaults. Circumvent this and take user default.
+        self._submit(lambda body: self._request('events', 'insert', 'id', calendarId="primary", body=body), event,
+                     on_success=on_success, on_error=on_error, description='schedule event "{}"'.format(title))
+
+    def schedule_events(self, events):
+        """
+        Same as `schedule_event`, for many events at once using batch requests. Unlike `schedule_event`, this waits
+        until the events have been scheduled.
+
+        Args:
+            events (list(tuple)): the events as tuples of the arguments of `schedule_event`
+
+        Returns:
+            tuple(int, dict(int, Exception)): the number of scheduled events and the errors by the index of the events
+                that could not be scheduled
         """
+        scheduled, errors = self._execute_batch({
+            str(index): self._request('events', 'insert', 'id', calendarId="primary", body=self._event_body(*event))
+            for index, event in enumerate(events)
+        })
+        return len(scheduled), {int(index): error for index, error in errors.items()}
+
+    def _event_body(self, title, start_datetime, end_datetime=None):
         event = {'summary': title}
         if end_datetime:
             event['start'] = {'dateTime': start_datetime.strftime(self._RFC_3339_DATETIME_FORMAT)}
@@ -38,9 +75,8 @@ class Calendar(GoogleAPI):
         else:
             event['start'] = {'date': start_datetime.strftime(self._YMD_DATE_FORMAT)}
             event['end'] = event['start']
-
-        # TODO: notification time defaults to 23:30 because of internal defaults. Circumvent this and take user default.
-        self._service.events().insert(calendarId="primary", body=event).execute()
+            event['transparency'] = 'transparent'  # all-day tasks don't make the day busy in free/busy information
+        return event
 
     def get_unfinished_tasks(self):
         """
@@ -48,45 +84,156 @@ class Calendar(GoogleAPI):
           - are daily: they are on the top of the calendar, and they
           - are not completed yet: they don't have the hashtag #done
         """
-        now = datetime.datetime.utcnow().isoformat() + 'Z'
-        past = (datetime.datetime.utcnow() -
-                datetime.timedelta(days=self._QUERY_DAYS)
-                ).isoformat() + 'Z'
-
-        events_result = self._service.events().list(calendarId='primary',
-                                                    timeMax=now, timeMin=past, maxResults=2000,
-                                                    singleEvents=True).execute()  # singleEvents for the 'start' field
-        events = events_result.get('items', [])
+        self.sync()
+        now = datetime.datetime.utcnow()
+        past = now - datetime.timedelta(days=self._QUERY_DAYS)
 
-        all_tasks = [Task(x['id'], x['summary']) for x in events if 'date' in x['start']]
+        all_tasks = (Task(event_id, summary) for event_id, summary
+                     in self._event_store.all_day_events(past.strftime(self._YMD_DATE_FORMAT),
+                                                         now.strftime(self._YMD_DATE_FORMAT)))
         return [task for task in all_tasks if not task.is_done()]
 
     def whitespace(self, start_datetime_utc, end_datetime_utc):
-        event_dicts = self._service.events().list(calendarId='primary', maxResults=2000,
-                                                  timeMin=start_datetime_utc.strftime(Calendar._RFC_3339_DATETIME_FORMAT),
-                                                  timeMax=end_datetime_utc.strftime(Calendar._RFC_3339_DATETIME_FORMAT),
-                                                  singleEvents=True).execute().get('items', [])
-        events = []
-        for event_dict in event_dicts:
-            event_start = event_dict.get('start', {}).get('dateTime')
-            event_end = event_dict.get('end', {}).get('dateTime')
-            if not event_start or not event_end:
-                continue  # daily events don't have dateTime
-
-            events.append(DatetimeInterval(start=Calendar.string_to_datetime(event_start).astimezone(pytz.UTC),
-                                           end=Calendar.string_to_datetime(event_end).astimezone(pytz.UTC)))
-
-        return DatetimeInterval(start_datetime_utc, end_datetime_utc).subtract(events)
+        """
+        Returns: IntervalSet: the periods between start_datetime_utc and end_datetime_utc without events. If
+            `FREE_BUSY_CALENDAR_IDS` is configured, these are the periods in which none of the calendars is busy.
+            Otherwise, these are the periods without timed events in the primary calendar.
+        """
+        if FREE_BUSY_CALENDAR_IDS:
+            busy = self.busy_times(FREE_BUSY_CALENDAR_IDS, start_datetime_utc, end_datetime_utc)
+            return busy.complement(start_datetime_utc, end_datetime_utc)
+
+        self.sync()
+        # daily events are not stored with a start and end time
+        events = np.array(self._event_store.timed_events(IntervalSet.to_epoch(start_datetime_utc),
+                                                         IntervalSet.to_epoch(end_datetime_utc)),
+                          dtype=np.int64).reshape(-1, 2)
+        return IntervalSet(events[:, 0], events[:, 1]).complement(start_datetime_utc, end_datetime_utc)
+
+    def busy_times(self, calendar_ids, start_datetime_utc, end_datetime_utc):
+        """
+        Gets the times in which any of the calendars is busy with one free/busy query per account. The accounts are
+        queried at the same time. Only the start and end of the busy times are downloaded, not the events.
+
+        Args:
+            calendar_ids (list): IDs of the calendars, like 'primary', or tuples (account, calendar ID) for calendars
+                of accounts of `ACCOUNTS`
+            start_datetime_utc (datetime.datetime): the start of the period
+            end_datetime_utc (datetime.datetime): the end of the period
+
+        Returns: IntervalSet: the busy times of all calendars together
+
+        Raises:
+            ValueError: if the free/busy information of a calendar is not available
+        """
+        self.wait_for_writes()  # events scheduled in the background are included
+        calendar_ids_per_account = {}
+        for calendar_id in calendar_ids:
+            account, calendar_id = calendar_id if isinstance(calendar_id, tuple) else (None, calendar_id)
+            if account not in self._services:
+                raise ValueError('account {} should be in FREE_BUSY_CALENDAR_IDS'.format(account))
+            calendar_ids_per_account.setdefault(account, []).append(calendar_id)
+
+        busy_times_per_account = self._map_concurrently(
+            lambda account: self._query_busy_times(account, calendar_ids_per_account[account], start_datetime_utc,
+                                                   end_datetime_utc),
+            calendar_ids_per_account)
+        return IntervalSet.from_datetimes(busy for busy_times in busy_times_per_account for busy in busy_times)
+
+    def _query_busy_times(self, account, calendar_ids, start_datetime_utc, end_datetime_utc):
+        """
+        Returns: list(tuple(datetime.datetime, datetime.datetime)): the start and end of the busy times of the
+            calendars of an account
+        """
+        response = self._execute(self._request('freebusy', 'query', 'calendars', account=account, body={
+            'timeMin': start_datetime_utc.strftime(self._RFC_3339_DATETIME_FORMAT),
+            'timeMax': end_datetime_utc.strftime(self._RFC_3339_DATETIME_FORMAT),
+            'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+        }))
+
+        calendars = response.get('calendars', {})
+        for calendar_id in calendar_ids:
+            errors = calendars.get(calendar_id, {}).get('errors')
+            if errors or calendar_id not in calendars:
+                raise ValueError('free/busy information of calendar {} is not available: {}'.format(
+                    calendar_id, ', '.join(error.get('reason', '') for error in errors or [])))
+        return [(self._parse_busy_datetime(busy['start']), self._parse_busy_datetime(busy['end']))
+                for calendar in calendars.values() for busy in calendar.get('busy', [])]
+
+    @staticmethod
+    def _parse_busy_datetime(datetime_string):
+        return datetime.datetime.fromisoformat(datetime_string.replace('Z', '+00:00'))
+
+    def sync(self):
+        """
+        Brings the local event store up to date. The first synchronization downloads the events from `_QUERY_DAYS`
+        ago onwards. After that, only the events that changed since the previous synchronization are downloaded, using
+        the sync token of Google Calendar. If Google invalidates the sync token, a full synchronization is done again.
+        """
+        self.wait_for_writes()
+        sync_token = self._event_store.sync_token
+        if sync_token:
+            query = {'syncToken': sync_token}
+        else:
+            past = datetime.datetime.utcnow() - datetime.timedelta(days=self._QUERY_DAYS)
+            query = {'timeMin': past.strftime(self._RFC_3339_DATETIME_FORMAT)}
+
+        try:
+            with self._event_store.transaction():
+                if not sync_token:
+                    self._event_store.clear()
+                for response in self._list_event_pages(**query):
+                    events = response.get('items', [])
+                    self._event_store.delete(event['id'] for event in events if event.get('status') == 'cancelled')
+                    self._event_store.upsert(self._event_to_row(event) for event in events
+                                             if event.get('status') != 'cancelled')
+                self._event_store.sync_token = response['nextSyncToken']
+        except HttpError as error:
+            if not sync_token or error.resp.status != self._SYNC_TOKEN_EXPIRED_STATUS:
+                raise
+            with self._event_store.transaction():
+                self._event_store.clear()
+            self.sync()
+
+    def _list_event_pages(self, **kwargs):
+        """
+        Yields: dict: the responses of listing the events in the primary calendar, page by page. Recurring events are
+            expanded into single events for the 'start' field.
+        """
+        return self._paginate_responses('events', self._EVENT_PAGE_FIELDS, calendarId='primary',
+                                        maxResults=self._PAGE_SIZE, singleEvents=True, **kwargs)
+
+    @classmethod
+    def _event_to_row(cls, event):
+        start, end = event.get('start', {}), event.get('end', {})
+        if 'date' in start:
+            return event['id'], event.get('summary', ''), start['date'], end['date'], None, None
+        return (event['id'], event.get('summary', ''), None, None,
+                IntervalSet.to_epoch(cls.string_to_datetime(start['dateTime'])),
+                IntervalSet.to_epoch(cls.string_to_datetime(end['dateTime'])))
 
     @classmethod
     def string_to_datetime(cls, datetime_string):
         datetime_string_without_semicolon_in_tz = datetime_string[:22] + datetime_string[23:25]
         return datetime.datetime.strptime(datetime_string_without_semicolon_in_tz, cls._RETURNED_DATETIME_FORMAT)
 
-    def change_title_with_prefix(self, task):
+    def change_titles_with_prefix(self, tasks):
         """
         When tasks are done or moved, they don't get deleted. To prevent loss of events, the events only get renamed.
+        The events are renamed using batch requests.
+
+        Args:
+            tasks (list(Task)): the tasks to rename
+
+        Returns:
+            tuple(list(Task), dict(str, Exception)): the renamed tasks and the errors by task ID of the tasks that
+                could not be renamed
         """
-        task.complete()
-        edit = {'summary': task.title}
-        self._service.events().patch(calendarId="primary", eventId=task.ID, body=edit).execute()
+        for task in tasks:
+            task.complete()
+        renamed, errors = self._execute_batch({
+            task.ID: self._request('events', 'patch', 'id', calendarId="primary", eventId=task.ID,
+                                   body={'summary': task.title})
+            for task in tasks
+        })
+        return [task for task in tasks if task.ID in renamed], errors
@@ -1,10 +1,38 @@
 TIMEZONE = 'Europe/Amsterdam'
 GOOGLE_TASKS_INBOX_ID = 'insert_inbox_ID_here'  # use `Inbox.get_lists`
 GOOGLE_TASKS_WAITING_LIST_ID = 'insert_waiting_list_ID_here'  # use `Inbox.get_lists`
+# Google accounts other than the account of `credentials/token.json`, by name, with the path of their token file.
+# The first use of an account asks to authorize access in the browser
+ACCOUNTS = {}
+# task lists by name, with the Google Tasks lists that they show one after the other. A Google Tasks list is a list ID
+# of the account of `credentials/token.json`, or a tuple (account, list ID) with an account of `ACCOUNTS`. New tasks
+# are made in the first Google Tasks list. The console uses the lists `inbox` and `waiting`
+TASK_LISTS = {
+    'inbox': [GOOGLE_TASKS_INBOX_ID],
+    'waiting': [GOOGLE_TASKS_WAITING_LIST_ID]
+}
+# maximum number of Google Tasks lists and accounts that are fetched at the same time
+SYNC_WORKERS = 8
+# all lists are refreshed in the background with this interval, in seconds. Set to None to only load lists on request
+PREFETCH_INTERVAL_SECONDS = 60
+# measurements of calls to Google and commands are appended to this file as JSON lines. Set to None to only keep them
+# in memory for the `stats` command
+METRICS_FILE = None
+# client-side limit of the calls to Google per API, as (calls per second, calls in a burst), to stay below the quota of
+# the Google Cloud project. A batch request counts as its number of calls. Remove an API to not limit it
+RATE_LIMITS = {
+    'calendar': (9, 100),
+    'tasks': (7.5, 100)
+}
 
 # the console can schedule time in the calendar
+# `ic` plans around the busy times of these calendars, like ['primary', 'colleague@example.com'], using one free/busy
+# query per account. A calendar of an account of `ACCOUNTS` is a tuple (account, calendar ID), like ('work', 'primary').
+# Set to None to plan around the timed events of the primary calendar, which are kept in the local store
+FREE_BUSY_CALENDAR_IDS = None
 DEFAULT_TASK_LENGTH = 7  # minutes, minutes that will be scheduled per inbox event
-# inbox event will be scheduled within these intervals. Format: dict(str, list(tuple(str, str)))
+# inbox event will be scheduled within these intervals. Format: dict(str, list(tuple(str, str))).
+# The intervals of a weekday may not overlap. Use '2400' for the end of the day.
 AVAILABLE_TIMES_PER_WEEKDAY = {
     'mon': [('0000', '2359')],  # timestamp format: 'HHMM'
     'tue': [('0000', '2359')],
@@ -1,26 +1,36 @@
 import datetime
-import itertools
 import os.path
 import re
 import sys
-from functools import reduce
 
+import httplib2
 import pytz
+from googleapiclient.errors import HttpError
 
-from productivity.constants import WEEKDAY_TO_INT, INT_TO_WEEKDAY
+from productivity.availability import Availability
+from productivity.constants import WEEKDAY_TO_INT
 from productivity.config import TIMEZONE, AVAILABLE_TIMES_PER_WEEKDAY
-from productivity.datetime_interval import DatetimeInterval
+from productivity.free_slot_index import FreeSlotIndex
+from productivity.interval_set import IntervalSet
+from productivity.metrics import metrics
 from productivity.inbox_google import Inbox
 from productivity.calendar_google import Calendar
 
 
 class Console:
     def __init__(self):
+        self._availability = Availability(AVAILABLE_TIMES_PER_WEEKDAY, TIMEZONE)  # validates the configuration
         self._inbox = Inbox()
-        self._calendar = Calendar()
+        self._lazy_calendar = None  # built when a command first needs the calendar
         self._define_input_handlers()
         self._day_end_hour = 3  # if time is before this hour, consider it as the previous day
 
+    @property
+    def _calendar(self):
+        if self._lazy_calendar is None:
+            self._lazy_calendar = Calendar()
+        return self._lazy_calendar
+
     def _define_input_handlers(self):
         self._input_handlers = [  # regex on the left, function to call on the right
             (r'c(?: )?(\d*)((?:mon)|(?:tue)|(?:wed)|(?:thu)|(?:fri)|(?:sat)|(?:sun)|)$', self._reschedule_task),
@@ -28,11 +38,13 @@ class Console:
             (r'd$', self._delete_task),
             (r'e (.+)$', self._edit_task),
             (r'h$', self._view_help),
-            (r'ic$', self.inbox_to_calendar),
+            (r'ic(?: (\d+))?( dry)?$', self.inbox_to_calendar),
             (r'n (.+)$', self._new_task),
             (r'q$', self._quit),
             (r'r$', self._reload_task),
             (r's$', self._skip_task),
+            (r'stats$', self._view_stats),
+            (r'v (\S+)$', self._view_list),
             (r'vi$', self._list_to_inbox),
             (r'vw$', self._list_to_waiting),
             (r'w$', self._task_to_waiting),
@@ -52,7 +64,13 @@ class Console:
             match = re.match(regex, query)
             if not match:
                 continue
-            handler(*match.groups())
+            try:
+                with metrics.measure('command ' + handler.__name__.lstrip('_')):
+                    handler(*match.groups())
+            except ValueError as error:
+                print(error)
+            except (HttpError, httplib2.HttpLib2Error, OSError) as error:  # failed after retrying temporary errors
+                print('Could not complete the command:', error)
             return
         self._view_help()
 
@@ -74,7 +92,9 @@ class Console:
 
     def run(self):
         while True:
-            print(self._inbox.get_task())
+            for description, error in self._inbox.pop_write_errors():
+                print('Could not {}: {}'.format(description, error))
+            print('Loading tasks...' if self._inbox.is_loading() else self._inbox.get_task())
             query = input('productivity: ')
             self._call_matching_handler(query)
 
@@ -87,8 +107,12 @@ class Console:
             days_to_go = self._get_number_days_ahead_for_weekday(day, repetitions-1)
             date = self._get_year_month_day(num_days_ahead=days_to_go)
 
-        self._calendar.schedule_event(self._inbox.get_task().title, datetime.datetime(*date))
-        self._inbox.complete_task()
+        if not self._inbox.current_task:
+            raise ValueError('No task is selected')
+        title = self._inbox.current_task.title
+        # the task is only completed once it has been scheduled, so that it is not lost if scheduling fails
+        self._inbox.complete_task(after=lambda on_success, on_error: self._calendar.schedule_event(
+            title, datetime.datetime(*date), on_success=on_success, on_error=on_error))
 
     def _delete_task(self):
         self._inbox.complete_task()
@@ -99,6 +123,9 @@ class Console:
     def _skip_task(self):
         self._inbox.skip_task()
 
+    def _view_list(self, list_name):
+        self._inbox.set_current_list(list_name)
+
     def _list_to_inbox(self):
         self._inbox.set_current_list('inbox')
 
@@ -110,94 +137,111 @@ class Console:
             print(f.read())
             print()
 
+    def _view_stats(self):
+        print(metrics.summary())
+
     def _quit(self):
+        self._inbox.wait_for_writes()
+        for description, error in self._inbox.pop_write_errors():
+            print('Could not {}: {}'.format(description, error))
         sys.exit()
 
     def calendar_to_inbox(self):
         self._inbox.set_current_list('inbox', force_reload=False)
 
         calendar_tasks = self._calendar.get_unfinished_tasks()
+        titles = {task.ID: task.title for task in calendar_tasks}
+        _, insert_errors = self._inbox.new_tasks(titles)
+        moved_tasks, rename_errors = self._calendar.change_titles_with_prefix(
+            [task for task in calendar_tasks if task.ID not in insert_errors])
+
         for task in calendar_tasks:
-            self._inbox.new_task(task.title, ignore_updating_locally=True)
-            self._calendar.change_title_with_prefix(task)
-        print(len(calendar_tasks), 'moved from calendar to inbox')
+            if task.ID in insert_errors:
+                print('Could not move "{}" to the inbox: {}'.format(titles[task.ID], insert_errors[task.ID]))
+            elif task.ID in rename_errors:
+                print('Moved "{}" to the inbox, but could not mark it as done in the calendar: {}'.format(
+                    titles[task.ID], rename_errors[task.ID]))
+        print(len(moved_tasks), 'moved from calendar to inbox,', len(calendar_tasks) - len(moved_tasks), 'failed')
 
         self._inbox.set_current_list('previous', force_reload=False)
 
         if self._inbox.get_current_list() == 'inbox':
             self._inbox.get_tasks(force_reload=True)
 
-    def inbox_to_calendar(self):
+    def inbox_to_calendar(self, days=None, dry_run=None):
+        """
+        Args:
+            days (str, optional): the number of days, starting today, in which tasks are planned. Defaults to 1.
+            dry_run (str, optional): if given, the planned events are printed instead of scheduled in the calendar
+        """
+        days = int(days) if days else 1
         self._inbox.set_current_list('inbox', force_reload=False)
 
-        current_date = self._get_year_month_day()
-        current_date_utc = pytz.timezone(TIMEZONE).localize(datetime.datetime(*current_date)).astimezone(pytz.UTC)
-        tomorrow_utc = current_date_utc + datetime.timedelta(days=1)
+        timezone = pytz.timezone(TIMEZONE)
+        current_date = datetime.datetime(*self._get_year_month_day())
+        current_date_utc = timezone.localize(current_date).astimezone(pytz.UTC)
+        end_utc = timezone.localize(current_date + datetime.timedelta(days=days)).astimezone(pytz.UTC)
 
-        desired_intervals = self._desired_intervals_from_config(current_date, tomorrow_utc)
+        desired_intervals = self._desired_intervals_from_config(current_date, days, end_utc)
 
-        whitespaces = self._determine_calendar_overlap_with_configured_times(current_date_utc, tomorrow_utc,
+        # the calendar is queried once for the whole period
+        whitespaces = self._determine_calendar_overlap_with_configured_times(current_date_utc, end_utc,
                                                                              desired_intervals)
-        number_scheduled = self._schedule_in_whitespace(whitespaces)
-
-        print(number_scheduled, 'tasks scheduled in calendar')
+        planned_events = self._schedule_in_whitespace(whitespaces)
+
+        if dry_run:
+            for title, start, end in planned_events:
+                print('{}-{} {}'.format(start.astimezone(timezone).strftime('%a %H:%M'),
+                                        end.astimezone(timezone).strftime('%H:%M'), title))
+            print(len(planned_events), 'tasks would be scheduled in calendar')
+        else:
+            number_scheduled, errors = self._calendar.schedule_events(planned_events)
+            for index, error in errors.items():
+                print('Could not schedule "{}": {}'.format(planned_events[index][0], error))
+            print(number_scheduled, 'tasks scheduled in calendar')
         self._inbox.set_current_list('previous', force_reload=False)
 
     def _schedule_in_whitespace(self, whitespaces):
+        """
+        Plans the tasks of the inbox in the whitespace with first-fit decreasing: from the longest task to the
+        shortest, every task is planned in the earliest whitespace that is long enough. Tasks that don't fit anywhere,
+        and tasks of zero minutes, are not planned. Nothing is scheduled in the calendar yet.
+
+        Args:
+            whitespaces (IntervalSet): free time in which the tasks of the inbox can be scheduled
+
+        Returns: list(tuple(str, datetime.datetime, datetime.datetime)): title, start and end of the planned events
+        """
         tasks = sorted(self._inbox.get_tasks(), key=lambda task: task.minutes(), reverse=True)
-        number_scheduled = 0
-        while tasks:
-            task = tasks.pop()
-            for whitespace in whitespaces:
-                if task.minutes() >= whitespace.minutes():
-                    continue
-
-                start, end = whitespace.start, whitespace.start + datetime.timedelta(minutes=task.minutes())
-                self._calendar.schedule_event(task.title, start, end)
-                number_scheduled += 1
-                break
-            else:
-                break
-
-            whitespaces = DatetimeInterval.simplify(
-                reduce(lambda a_list, another_list: a_list + another_list,
-                       [interval.subtract([DatetimeInterval(start, end)]) for interval in whitespaces],
-                       []))
-        return number_scheduled
-
-    def _determine_calendar_overlap_with_configured_times(self, current_date_utc, tomorrow_utc, desired_intervals):
-        whitespace_in_calendar = self._calendar.whitespace(current_date_utc, tomorrow_utc)
-        whitespaces = [
-            intersected_interval for intersected_interval
-            in map(lambda intervals: intervals[0].intersect(intervals[1]),
-                   itertools.product(desired_intervals, whitespace_in_calendar))
-            if intersected_interval
-        ]
-        return whitespaces
+        free_slots = FreeSlotIndex(whitespaces)
+        planned_events = []
+        for task in tasks:
+            if task.minutes() <= 0:
+                continue  # an event without duration would not reserve any time
+            slot_index = free_slots.first_fit(task.minutes())
+            if slot_index is None:
+                continue
 
-    def _desired_intervals_from_config(self, current_date, tomorrow_utc):
-        current_weekday_number = self._get_current_weekday_number()
-        current_weekday_name = INT_TO_WEEKDAY[current_weekday_number]
-        desired_times_strings = AVAILABLE_TIMES_PER_WEEKDAY.get(current_weekday_name, [])
-        desired_times = [
-            (pytz.timezone(TIMEZONE).localize(datetime.datetime(*current_date,
-                                                                int(start_str[:2]),
-                                                                int(start_str[2:4]))).astimezone(pytz.UTC),
-             pytz.timezone(TIMEZONE).localize(datetime.datetime(*current_date,
-                                                                int(end_str[:2]),
-                                                                int(end_str[2:4]))).astimezone(pytz.UTC))
-            for start_str, end_str in desired_times_strings
-        ]
+            start, end = free_slots.carve(slot_index, task.minutes())
+            planned_events.append((task.title, start, end))
+        return planned_events
 
+    def _determine_calendar_overlap_with_configured_times(self, start_utc, end_utc, desired_intervals):
+        whitespace_in_calendar = self._calendar.whitespace(start_utc, end_utc)
+        return desired_intervals.intersection(whitespace_in_calendar)
+
+    def _desired_intervals_from_config(self, date, days, end_utc):
+        """
+        Args:
+            date (datetime.datetime): the first day for which the available times are configured
+            days (int): the number of days
+            end_utc (datetime.datetime): available times after this moment are discarded
+
+        Returns: IntervalSet: the available times that are not in the past
+        """
         # discard intervals that are in the past
-        interval_until_end_of_day = DatetimeInterval(datetime.datetime.now(tz=pytz.UTC), tomorrow_utc)
-        desired_intervals = [
-            interval for interval
-            in (interval_until_end_of_day.intersect(DatetimeInterval(*start_end))
-                for start_end in desired_times)
-            if interval
-        ]
-        return desired_intervals
+        interval_until_end = IntervalSet.from_datetimes([(datetime.datetime.now(tz=pytz.UTC), end_utc)])
+        return self._availability.intervals(date.date(), days).intersection(interval_until_end)
 
     def _new_task(self, title):
         self._inbox.new_task(title=title)
@@ -1,12 +1,5 @@
 import os.path
 
-from productivity.config import GOOGLE_TASKS_INBOX_ID, GOOGLE_TASKS_WAITING_LIST_ID
-
-LIST_IDS = {
-    'inbox': GOOGLE_TASKS_INBOX_ID,
-    'waiting': GOOGLE_TASKS_WAITING_LIST_ID
-}
-
 _WEEKDAY_INTS = [('mon', 0),
                  ('tue', 1),
                  ('wed', 2),
@@ -17,7 +10,11 @@ _WEEKDAY_INTS = [('mon', 0),
 WEEKDAY_TO_INT = dict(_WEEKDAY_INTS)
 INT_TO_WEEKDAY = dict(reversed(weekday_int) for weekday_int in _WEEKDAY_INTS)
 
-TOKEN_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'token.pickle')
+TOKEN_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'token.json')
+PICKLE_TOKEN_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'token.pickle')  # of earlier versions
+EVENT_STORE_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'events.sqlite')
+TASK_STORE_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'tasks.sqlite')
+RESPONSE_STORE_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'responses.sqlite')
 CREDENTIALS_FILE = os.path.join(os.path.split(__file__)[0], '..', 'credentials', 'credentials.json')
 SCOPES = ['https://www.googleapis.com/auth/calendar',
           'https://www.googleapis.com/auth/tasks']
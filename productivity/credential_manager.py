@@ -0,0 +1,90 @@
+import datetime
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+from productivity.metrics import metrics
+
+
+class CredentialManager:
+    """
+    Keeps OAuth credentials valid for as long as the process runs. The access token is refreshed on a background thread
+    before it expires, so calls to Google never wait for a refresh. The token is saved as JSON after every refresh. The
+    file is replaced in one step, so it is never left half-written.
+    """
+    _REFRESH_MARGIN = datetime.timedelta(minutes=5)  # access tokens are refreshed this long before they expire
+    _RETRY_SECONDS = 30  # wait before retrying a background refresh that failed
+
+    def __init__(self, token_file, credentials_file, scopes, pickle_token_file=None):
+        """
+        Loads the token, or asks the user to authorize access in the browser if there is no token that can be refreshed
+        yet.
+
+        Args:
+            token_file (str): path of the token in JSON
+            credentials_file (str): path of the OAuth client credentials, used when the user has to authorize access
+            scopes (list(str)): the scopes to authorize
+            pickle_token_file (str, optional): path of a token in the pickle format of earlier versions. It is
+                converted to JSON in `token_file` and removed.
+        """
+        self._token_file = token_file
+        self._credentials_file = credentials_file
+        self._scopes = scopes
+        self._pickle_token_file = pickle_token_file
+        self._lock = threading.Lock()
+        self.credentials = self._load()
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def _load(self):
+        credentials = None
+        if os.path.exists(self._token_file):
+            credentials = Credentials.from_authorized_user_file(self._token_file, self._scopes)
+        elif self._pickle_token_file and os.path.exists(self._pickle_token_file):
+            with open(self._pickle_token_file, 'rb') as token:
+                credentials = pickle.load(token)
+            self._save(credentials)
+            os.remove(self._pickle_token_file)
+
+        if not credentials or not credentials.refresh_token:
+            flow = InstalledAppFlow.from_client_secrets_file(self._credentials_file, self._scopes)
+            credentials = flow.run_local_server(port=0)
+            self._save(credentials)
+        # an expired access token is refreshed right away by the background thread, so loading does not wait for it
+        return credentials
+
+    def _save(self, credentials):
+        directory = os.path.dirname(os.path.abspath(self._token_file))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as token:
+            token.write(credentials.to_json())
+        os.chmod(token.name, 0o600)  # only the user can read the token
+        os.replace(token.name, self._token_file)
+
+    def seconds_until_refresh(self):
+        """
+        Returns: float: the number of seconds until the access token is refreshed, 0 if it is due
+        """
+        refresh_at = self.credentials.expiry - self._REFRESH_MARGIN
+        return max((refresh_at - datetime.datetime.utcnow()).total_seconds(), 0)
+
+    def refresh(self):
+        """
+        Refreshes the access token now and saves it.
+        """
+        with self._lock, metrics.measure('credentials refresh'):
+            self.credentials.refresh(Request())
+            self._save(self.credentials)
+
+    def _refresh_in_background(self):
+        while self.credentials.expiry is not None:  # tokens without expiry are never refreshed
+            time.sleep(self.seconds_until_refresh())
+            try:
+                self.refresh()
+            except Exception as error:  # calls still refresh the token themselves when it has expired
+                print('Could not refresh the credentials in the background:', error)
+                time.sleep(self._RETRY_SECONDS)
@@ -75,21 +75,8 @@ class DatetimeInterval:
         Returns: list(DatetimeInterval): sorted DatetimeIntervals without pairwise overlap. The pairwise intersection
             between all elements is None.
         """
-        if not intervals:
-            return []
-
-        sorted_intervals = sorted(intervals)
-        interval_to_combine = sorted_intervals[0]
-        results = []
-        for interval in sorted_intervals[1:]:
-            union = interval_to_combine.union(interval)
-            if len(union) == 1:  # interval and interval_to_combine can be combined
-                interval_to_combine = union[0]
-            elif len(union) == 2:
-                results.append(interval_to_combine)
-                interval_to_combine = interval  # combining is not possible: update interval_to_combine
-        results.append(interval_to_combine)
-        return results
+        from productivity.interval_set import IntervalSet  # IntervalSet builds on DatetimeInterval
+        return IntervalSet.from_intervals(intervals).to_intervals()
 
     def subtract(self, intervals: List[DatetimeInterval]) -> List[DatetimeInterval]:
         """
@@ -104,10 +91,5 @@ class DatetimeInterval:
         Returns: list(DatetimeInterval): DatetimeIntervals such that the union of the returned DatetimeIntervals and
             intervals is self.
         """
-        intervals_with_boundary = ([DatetimeInterval(self.start - datetime.timedelta(seconds=1), self.start)]
-                                   + intervals
-                                   + [DatetimeInterval(self.end, self.end + datetime.timedelta(seconds=1))])
-        simplified_intervals = DatetimeInterval.simplify(intervals_with_boundary)
-        whitespace = [DatetimeInterval(interval_before.end, interval_after.start) for interval_before, interval_after
-                      in zip(simplified_intervals[:-1], simplified_intervals[1:])]
-        return [interval for interval in map(self.intersect, whitespace) if interval]
+        from productivity.interval_set import IntervalSet  # IntervalSet builds on DatetimeInterval
+        return IntervalSet.from_intervals([self]).difference(IntervalSet.from_intervals(intervals)).to_intervals()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import datetime
+import numbers
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from productivity.datetime_interval import DatetimeInterval
+from productivity.interval_set import IntervalSet
+
+_MICROSECONDS_PER_MINUTE = 60 * 10 ** 6
+
+
+class FreeSlotIndex:
+    """
+    Free time slots ordered by start, with a max segment tree over the slot lengths. Finding the first slot that fits
+    a duration and carving a duration out of the start of a slot both take logarithmic time in the number of slots.
+    """
+
+    def __init__(self, free_time: IntervalSet):
+        """
+        Args:
+            free_time (IntervalSet): the free time from which slots can be carved
+        """
+        self._free_time = free_time
+        self._starts = free_time.starts.tolist()
+        self._ends = free_time.ends.tolist()
+
+        self._leaf_offset = 1
+        while self._leaf_offset < max(len(self._starts), 1):
+            self._leaf_offset *= 2
+        tree = np.zeros(2 * self._leaf_offset, dtype=np.int64)
+        tree[self._leaf_offset:self._leaf_offset + len(self._starts)] = free_time.ends - free_time.starts
+        for node in range(self._leaf_offset - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self._tree = tree.tolist()
+
+    def __len__(self):
+        return len(self._starts)
+
+    @staticmethod
+    def _to_microseconds(minutes: numbers.Number) -> int:
+        return int(round(minutes * _MICROSECONDS_PER_MINUTE))
+
+    def first_fit(self, minutes: numbers.Number) -> Optional[int]:
+        """
+        Returns: int or None: index of the earliest slot with at least the given number of minutes free.
+            None if no slot is long enough.
+        """
+        duration = self._to_microseconds(minutes)
+        if not self._starts or self._tree[1] < duration:
+            return None
+
+        node = 1
+        while node < self._leaf_offset:
+            node = 2 * node if self._tree[2 * node] >= duration else 2 * node + 1
+        return node - self._leaf_offset
+
+    def carve(self, index: int, minutes: numbers.Number) -> Tuple[datetime.datetime, datetime.datetime]:
+        """
+        Occupies the given number of minutes at the start of a slot.
+
+        Args:
+            index (int): index of the slot, as returned by `first_fit`
+            minutes (numbers.Number): the number of minutes to occupy
+
+        Returns: tuple(datetime.datetime, datetime.datetime): start and end of the occupied time
+        """
+        start = self._starts[index]
+        end = start + self._to_microseconds(minutes)
+        if end > self._ends[index]:
+            raise ValueError('Slot %s has less than %s minutes free' % (index, minutes))
+        self._starts[index] = end
+
+        node = index + self._leaf_offset
+        self._tree[node] = self._ends[index] - end
+        node //= 2
+        while node:
+            self._tree[node] = max(self._tree[2 * node], self._tree[2 * node + 1])
+            node //= 2
+        return self._free_time.to_datetime(start), self._free_time.to_datetime(end)
+
+    def to_intervals(self) -> List[DatetimeInterval]:
+        return IntervalSet(np.array(self._starts, dtype=np.int64), np.array(self._ends, dtype=np.int64),
+                           aware=self._free_time.aware).to_intervals()
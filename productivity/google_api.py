@@ -1,30 +1,413 @@
-import os.path
-import pickle
+import concurrent.futures
+import datetime
+import email.utils
+import random
+import threading
+import time
 
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
+import httplib2
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
 
-from productivity.constants import TOKEN_FILE, CREDENTIALS_FILE, SCOPES
+from productivity.config import ACCOUNTS, RATE_LIMITS, SYNC_WORKERS
+from productivity.constants import TOKEN_FILE, PICKLE_TOKEN_FILE, CREDENTIALS_FILE, SCOPES, RESPONSE_STORE_FILE
+from productivity.credential_manager import CredentialManager
+from productivity.local_store import ResponseStore
+from productivity.metrics import metrics
+from productivity.rate_limiter import TokenBucket
+from productivity.session_http import SessionHttp
+from productivity.write_queue import WriteBehindQueue
+
+
+class _MeteredHttp:
+    """
+    Wraps a transport to count the bytes of the requests and responses of one call to `execute`. Responses are
+    counted by their content-length, which is the number of bytes that were transferred. The content itself has
+    already been decompressed.
+    """
+
+    def __init__(self, http):
+        self._http = http
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def request(self, uri, method='GET', body=None, *args, **kwargs):
+        response, content = self._http.request(uri, method, body, *args, **kwargs)
+        self.bytes_sent += len(body or b'')
+        self.bytes_received += int(response.get('content-length', len(content or b'')))
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+class NotModified(dict):
+    """
+    Response that Google did not send again because it did not change since it was stored. Callers that already
+    processed the response can skip it.
+    """
 
 
 class GoogleAPI:
-    def _setup_credentials(self):
-        self._creds = None
-        if os.path.exists(TOKEN_FILE):
-            with open(TOKEN_FILE, 'rb') as token:
-                self._creds = pickle.load(token)
-
-        if not self._creds or not self._creds.valid:
-            if self._creds and self._creds.expired and self._creds.refresh_token:
-                self._creds.refresh(Request())
+    _BATCH_SIZE = 50  # number of calls per batch request
+    _RETRIES = 5  # number of times that calls with a temporary error are retried, also the calls in batch requests
+    _RETRY_SECONDS = 1  # maximum wait before the first retry, doubles with every retry. The wait is random up to this
+    _MAX_RETRY_SECONDS = 32  # maximum wait before a retry, unless Google asks to wait longer with Retry-After
+
+    # shared by all services of an API in the process, so that the calls of all threads count towards one limit
+    _shared_rate_limiters = {}
+    _shared_rate_limiters_lock = threading.Lock()
+
+    _POOL_SIZE = 10  # number of connections that are kept alive per host
+
+    # shared by all services in the process per account, so that the token is loaded and refreshed once and connections
+    # are reused. The account of `TOKEN_FILE` is None.
+    _shared_credential_managers = {}
+    _shared_https = {}
+    _shared_creds_lock = threading.Lock()
+
+    # shared by all services in the process, so that mutations are sent to Google in the order in which they were made
+    _shared_write_queue = None
+    _shared_write_queue_lock = threading.Lock()
+
+    # shared by all services in the process, so that responses with an ETag are stored once
+    _shared_response_store = None
+    _shared_response_store_lock = threading.Lock()
+
+    # shared by all services in the process, so that at most `SYNC_WORKERS` lists and calendars are fetched at once
+    _shared_executor = None
+    _shared_executor_lock = threading.Lock()
+
+    # httplib2-compatible transports used instead of Google by account, like `googleapiclient.http.HttpMock`. Used for
+    # testing. Accounts without a transport use the transport of account None.
+    _transports = {}
+
+    @staticmethod
+    def use_transport(transport, account=None):
+        """
+        Sends the requests of services that are made afterwards to a transport instead of Google. No credentials are
+        loaded for these services.
+
+        Args:
+            transport: object with the `request` method of `httplib2.Http`, or None to use Google again
+            account (str, optional): the account whose requests are sent to the transport, None for all accounts
+                that have no transport of their own
+        """
+        if transport is None:
+            GoogleAPI._transports.pop(account, None)
+        else:
+            GoogleAPI._transports[account] = transport
+
+    @staticmethod
+    def _transport_of(account):
+        return GoogleAPI._transports.get(account, GoogleAPI._transports.get(None))
+
+    def _setup_credentials(self, accounts=(None,)):
+        """
+        Args:
+            accounts (iterable(str), optional): the accounts whose credentials are used: names of `ACCOUNTS`, and None
+                for the account of `TOKEN_FILE`. Defaults to the account of `TOKEN_FILE`.
+        """
+        for account in accounts:
+            if account is not None and account not in ACCOUNTS:
+                raise ValueError('account {} should be in {}'.format(account, list(ACCOUNTS.keys())))
+            if self._transport_of(account) is not None:
+                continue
+            with GoogleAPI._shared_creds_lock:
+                if account not in GoogleAPI._shared_credential_managers:
+                    with metrics.measure('credentials'):
+                        if account is None:
+                            manager = CredentialManager(TOKEN_FILE, CREDENTIALS_FILE, SCOPES,
+                                                        pickle_token_file=PICKLE_TOKEN_FILE)
+                        else:
+                            manager = CredentialManager(ACCOUNTS[account], CREDENTIALS_FILE, SCOPES)
+                    GoogleAPI._shared_credential_managers[account] = manager
+                    GoogleAPI._shared_https[account] = SessionHttp(manager.credentials, pool_size=self._POOL_SIZE)
+
+    def _setup_service(self, service, version, accounts=(None,)):
+        """
+        Builds the service of every account, after `_setup_credentials` of the accounts. The service of the first
+        account is also `self._service`.
+        """
+        # all services and threads of an account share one transport, which is thread-safe
+        https = {account: self._transport_of(account) or GoogleAPI._shared_https[account] for account in accounts}
+        # the discovery document bundled with googleapiclient is used, so building does not need the network
+        self._services = {account: build(service, version, http=http, static_discovery=True, cache_discovery=False)
+                          for account, http in https.items()}
+        self._http, self._service = https[accounts[0]], self._services[accounts[0]]
+
+        with GoogleAPI._shared_rate_limiters_lock:
+            if service not in GoogleAPI._shared_rate_limiters and RATE_LIMITS.get(service):
+                GoogleAPI._shared_rate_limiters[service] = TokenBucket(*RATE_LIMITS[service])
+        self._rate_limiter = GoogleAPI._shared_rate_limiters.get(service)
+
+        with GoogleAPI._shared_response_store_lock:
+            if GoogleAPI._shared_response_store is None:
+                GoogleAPI._shared_response_store = ResponseStore(RESPONSE_STORE_FILE)
+
+    def _execute(self, request):
+        """
+        Executes a request or batch request with the shared transport. Calls wait for the rate limiter
+        of the API, and are retried with jittered exponential backoff when they fail with a temporary error.
+
+        The duration, the transferred bytes and the number of calls are recorded in the metrics, by method like
+        'tasks.tasks.list'. Batch requests are recorded by the method of their first call, like
+        'tasks.tasks.insert (batch)'.
+
+        GET requests are conditional if their response was stored: responses that contain an 'etag' field are stored,
+        and when the same request is made again, Google responds with 304 Not Modified if the response did not change.
+        The stored response is then returned as `NotModified`.
+        """
+        if isinstance(request, BatchHttpRequest):
+            methods = [call.methodId for call in request._requests.values()]
+            name, calls = '{} (batch)'.format(methods[0] if methods else 'empty'), len(methods)
+        else:
+            name, calls = request.methodId, 1
+        conditional = not isinstance(request, BatchHttpRequest) and request.method == 'GET'
+        etag = GoogleAPI._shared_response_store.etag(request.uri) if conditional else None
+        if conditional:
+            # a copy, because the requests of the next pages share the headers of the request of the first page
+            request.headers = {key: value for key, value in request.headers.items() if key != 'if-none-match'}
+            if etag is not None:
+                request.headers['if-none-match'] = etag
+
+        for attempt in range(self._RETRIES + 1):
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire(calls)
+            try:
+                response = self._execute_once(request, name, calls, etag)
+                if conditional and not isinstance(response, NotModified) and response.get('etag'):
+                    GoogleAPI._shared_response_store.put(request.uri, response['etag'], response)
+                return response
+            except Exception as error:
+                if attempt == self._RETRIES or not self._is_temporary_error(error):
+                    raise
+                self._back_off(attempt, [error])
+
+    def _execute_once(self, request, name, calls, etag=None):
+        """
+        Args:
+            etag (str, optional): the ETag of the response that was stored for the request
+        """
+        # the transport of the account of the request, or of the first call of a batch request
+        first = next(iter(request._requests.values()), None) if isinstance(request, BatchHttpRequest) else request
+        http = _MeteredHttp(first.http if first is not None else self._http)
+        start = time.perf_counter()
+        error = True
+        try:
+            try:
+                response = request.execute(http=http)
+            except HttpError as http_error:
+                if etag is None or http_error.resp.status != 304:
+                    raise
+                stored = GoogleAPI._shared_response_store.get(request.uri)  # only read when Google did not send it
+                if stored is None:  # no longer stored, because many other responses were stored since
+                    raise
+                response = NotModified(stored[1])
+            error = False
+            return response
+        finally:
+            metrics.record(name, time.perf_counter() - start, bytes_sent=http.bytes_sent,
+                           bytes_received=http.bytes_received, calls=calls, error=error)
+
+    def _back_off(self, attempt, errors):
+        """
+        Waits before retrying calls that failed with temporary errors: a random time up to `_RETRY_SECONDS` doubled
+        with every attempt, or longer if Google asks to wait with Retry-After. When Google responds that the rate limit
+        is exceeded, all calls to the API wait.
+
+        Args:
+            attempt (int): the number of retries so far
+            errors (list(Exception)): the temporary errors of the calls that are retried
+        """
+        seconds = random.uniform(0, min(self._RETRY_SECONDS * 2 ** attempt, self._MAX_RETRY_SECONDS))
+        seconds = max([seconds] + [self._retry_after_seconds(error) for error in errors])
+        if self._rate_limiter is not None and any(self._is_rate_limit_error(error) for error in errors):
+            self._rate_limiter.pause(seconds)
+        time.sleep(seconds)
+
+    @staticmethod
+    def _retry_after_seconds(error):
+        """
+        Returns: float: the number of seconds to wait according to the Retry-After header of the response, or 0
+        """
+        retry_after = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+        if not retry_after:
+            return 0
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:  # an HTTP date
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                return 0
+            return max((retry_at - datetime.datetime.now(tz=datetime.timezone.utc)).total_seconds(), 0)
+
+    def _submit(self, build_request, body, key=None, on_success=None, on_error=None, description=''):
+        """
+        Sends a mutation to Google in the background, using the write-behind queue shared by all services. The mutation
+        is sent with `_execute`, which retries temporary errors.
+
+        Args:
+            build_request (callable): function of the body that returns the request. It is called when the mutation is
+                sent, so it can use IDs that became known after submitting.
+            body (dict): the body of the request
+            key (hashable, optional): mutations with the same key that are still waiting are combined into one request
+            on_success (callable, optional): called with the response, on the background thread
+            on_error (callable, optional): called with the error if the mutation failed, on the background thread. The
+                error is also returned by `pop_write_errors`.
+            description (str, optional): description of the mutation, used when reporting errors
+        """
+        with GoogleAPI._shared_write_queue_lock:
+            if GoogleAPI._shared_write_queue is None:
+                GoogleAPI._shared_write_queue = WriteBehindQueue()
+        GoogleAPI._shared_write_queue.submit(lambda merged_body: self._execute(build_request(merged_body)), body,
+                                             key=key, on_success=on_success, on_error=on_error,
+                                             description=description)
+
+    def wait_for_writes(self):
+        """
+        Waits until all mutations made in the background have been sent to Google.
+        """
+        if GoogleAPI._shared_write_queue is not None:
+            GoogleAPI._shared_write_queue.flush()
+
+    def pop_write_errors(self):
+        """
+        Returns: list(tuple(str, Exception)): description and error of the background mutations that failed since the
+            previous call
+        """
+        if GoogleAPI._shared_write_queue is None:
+            return []
+        return GoogleAPI._shared_write_queue.pop_errors()
+
+    def _request(self, collection, method, fields, account=None, **kwargs):
+        """
+        Builds a request to Google. All requests are built here, so that every response only contains the fields that
+        are used. Responses are compressed with gzip by the transport.
+
+        Args:
+            collection (str): a collection of the service, like 'events'
+            method (str): a method of the collection, like 'list'
+            fields (str): the fields of the response that are used, in the syntax of partial responses, like
+                'nextPageToken,items(id,title)'. Use 'id' if the response is not used.
+            account (str, optional): the account of the request, None for the account of `TOKEN_FILE`
+            **kwargs: the parameters of the request
+
+        Returns: googleapiclient.http.HttpRequest: the request
+        """
+        return getattr(getattr(self._services[account], collection)(), method)(fields=fields, **kwargs)
+
+    def _paginate(self, collection, fields, account=None, **kwargs):
+        """
+        Lists all items of a collection, following `nextPageToken` until the last page.
+
+        Args:
+            collection (str): a collection of the service, like 'events'
+            fields (str): the fields of the responses that are used, including 'nextPageToken', like
+                'nextPageToken,items(id,title)'
+            account (str, optional): the account of the collection, None for the account of `TOKEN_FILE`
+            **kwargs: the parameters of the list request
+
+        Yields: dict: the items of the pages, as the pages arrive
+        """
+        for response in self._paginate_responses(collection, fields, account=account, **kwargs):
+            yield from response.get('items', [])
+
+    def _paginate_responses(self, collection, fields, account=None, **kwargs):
+        """
+        Same as `_paginate`, but yields the complete response of every page.
+        """
+        resource = getattr(self._services[account], collection)()
+        request = self._request(collection, 'list', fields, account=account, **kwargs)
+        while request is not None:
+            response = self._execute(request)
+            yield response
+            request = resource.list_next(request, response)  # keeps the fields of the request
+
+    def _map_concurrently(self, function, items):
+        """
+        Calls a function for every item on the thread pool shared by all services, so that at most `SYNC_WORKERS`
+        calls run at the same time. The function should not call `_map_concurrently` itself, because it could wait for
+        a worker that is waiting for it.
+
+        Returns: list: the results in the order of the items
+
+        Raises:
+            Exception: the first exception of the calls in the order of the items, after all calls have finished
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        with GoogleAPI._shared_executor_lock:
+            if GoogleAPI._shared_executor is None:
+                GoogleAPI._shared_executor = concurrent.futures.ThreadPoolExecutor(SYNC_WORKERS,
+                                                                                   thread_name_prefix='sync')
+        futures = [GoogleAPI._shared_executor.submit(function, item) for item in items]
+        concurrent.futures.wait(futures)
+        return [future.result() for future in futures]
+
+    def _execute_batch(self, requests):
+        """
+        Executes requests in batch requests of at most `_BATCH_SIZE` calls. Calls with a temporary error, like a rate
+        limit or server error, are retried in a new batch. Other calls are not executed again. When a whole batch
+        request fails, after `_execute` has retried it, its error is the error of every call in it, and the other
+        batches are still executed.
+
+        Args:
+            requests (dict(str, googleapiclient.http.HttpRequest)): the requests by a key of choice
+
+        Returns:
+            tuple(dict(str, dict), dict(str, Exception)): the responses of the successful calls and the errors of the
+                failed calls, by key
+        """
+        responses, errors = {}, {}
+
+        def callback(key, response, exception):
+            if exception is None:
+                responses[key] = response
             else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    CREDENTIALS_FILE, SCOPES)
-                self._creds = flow.run_local_server(port=0)
+                errors[key] = exception
+
+        pending = list(requests)
+        failed_batch_keys = set()  # keys of calls in batch requests that failed, which were retried by `_execute`
+        for attempt in range(self._RETRIES + 1):
+            for batch_start in range(0, len(pending), self._BATCH_SIZE):
+                keys = pending[batch_start:batch_start + self._BATCH_SIZE]
+                batch = self._service.new_batch_http_request(callback=callback)
+                for key in keys:
+                    batch.add(requests[key], request_id=key)
+                try:
+                    self._execute(batch)
+                except (HttpError, httplib2.HttpLib2Error, OSError) as error:
+                    for key in keys:
+                        if key not in responses:
+                            errors[key] = error
+                            failed_batch_keys.add(key)
+
+            pending = [key for key in pending if key in errors and key not in failed_batch_keys
+                       and self._is_temporary_error(errors[key])]
+            if not pending or attempt == self._RETRIES:
+                break
+            self._back_off(attempt, [errors[key] for key in pending])
+            for key in pending:
+                del errors[key]
+        return responses, errors
 
-            with open(TOKEN_FILE, 'wb') as token:
-                pickle.dump(self._creds, token)
+    @classmethod
+    def _is_temporary_error(cls, error):
+        if isinstance(error, (OSError, httplib2.HttpLib2Error)):
+            return True  # connection problems
+        if not isinstance(error, HttpError):
+            return False
+        return error.resp.status in (500, 502, 503, 504) or cls._is_rate_limit_error(error)
 
-    def _setup_service(self, service, version):
-        self._service = build(service, version, credentials=self._creds)
+    @staticmethod
+    def _is_rate_limit_error(error):
+        if not isinstance(error, HttpError):
+            return False
+        return error.resp.status == 429 or (
+            error.resp.status == 403 and error.error_details and any(
+                detail.get('reason') in ('rateLimitExceeded', 'userRateLimitExceeded')
+                for detail in error.error_details if isinstance(detail, dict)))
@@ -1,9 +1,14 @@
-import copy
+import datetime
+import itertools
+import threading
+import uuid
 
-from productivity.constants import LIST_IDS
-from productivity.config import GOOGLE_TASKS_INBOX_ID
+from productivity.constants import TASK_STORE_FILE
+from productivity.config import PREFETCH_INTERVAL_SECONDS, TASK_LISTS
+from productivity.local_store import TaskStore
 from productivity.task import Task
-from productivity.google_api import GoogleAPI
+from productivity.task_list import TaskList
+from productivity.google_api import GoogleAPI, NotModified
 
 
 def _check_task_exists(f):
@@ -15,32 +20,128 @@ def _check_task_exists(f):
 
 
 class Inbox(GoogleAPI):
+    _RFC_3339_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'  # used in Google Tasks API list tasks
+    _PAGE_SIZE = 100  # maximum page size of the Google Tasks API
+    _SYNC_MARGIN = datetime.timedelta(minutes=1)  # tolerated clock difference with the Google Tasks servers
+    _LOCAL_ID_PREFIX = 'local-'  # ID of a new task until Google Tasks has assigned an ID
+    _TASK_FIELDS = 'id,title,status,deleted,position'  # the fields of tasks that are used
+    # the ETag of pages is used to ask Google to only send pages that changed
+    _TASK_PAGE_FIELDS = 'etag,nextPageToken,items({})'.format(_TASK_FIELDS)
+    _LIST_PAGE_FIELDS = 'etag,nextPageToken,items(id,title)'
+
     def __init__(self):
-        self._setup_credentials()
-        self._setup_service('tasks', 'v1')
+        accounts = [None] + sorted({account for list_name in TASK_LISTS for account, _ in self._sources(list_name)
+                                    if account is not None})
+        self._setup_credentials(accounts)
+        self._setup_service('tasks', 'v1', accounts)
+        self._task_store = TaskStore(TASK_STORE_FILE)
         self._set_hidden_variables()
         self._set_variables()
 
-        self.get_tasks()
+        # the first tasks are loaded in the background, so that commands that don't need them can be used right away
+        self._first_load_done = threading.Event()
+        self._background_loader = threading.Thread(target=self._load_in_background, daemon=True)
+        self._background_loader.start()
 
     def _set_hidden_variables(self):
-        self._ignored_tasks = []
-        self._current_list_id = GOOGLE_TASKS_INBOX_ID
-        self._previous_list_id = GOOGLE_TASKS_INBOX_ID
-        self._tasks = None
+        self._skipped_ids = set()  # kept when lists are reloaded
+        self._current_list = 'inbox'
+        self._previous_list = 'inbox'
+        self._tasks = {}  # source -> TaskList, for the Google Tasks lists that have been loaded
+        self._tasks_lock = threading.RLock()
+        self._first_load_done = None
+        self._background_loader = None
+        self._prefetch_now = threading.Event()
+        # (list ID, task ID) -> number of the change, for tasks changed locally while a synchronization is in progress
+        self._local_changes = {}
+        self._local_change_numbers = itertools.count()
+        self._syncs_in_progress = 0
 
     def _set_variables(self):
         self.current_task = None
 
     def new_task(self, title, ignore_updating_locally=False):
-        task = {'title': title}
-        result = self._service.tasks().insert(tasklist=self._current_list_id, body=task).execute()
+        self._new_task_in_list(self._sources(self._current_list)[0], title, update_locally=not ignore_updating_locally)
+
+    def _new_task_in_list(self, source, title, update_locally=True, on_success=None, on_error=None):
+        """
+        Makes a new task right away in the loaded tasks, and in Google Tasks in the background. The task has a local ID
+        until Google Tasks has made it.
+
+        Args:
+            source (tuple(str, str)): the account and ID of the Google Tasks list
+            on_success (callable, optional): called with the new task once Google Tasks has made it
+            on_error (callable, optional): called with the error if Google Tasks could not make the task
+        """
+        account, list_id = source
+        task = Task(identifier=self._LOCAL_ID_PREFIX + uuid.uuid4().hex, title=title)
+        if update_locally:
+            with self._tasks_lock:
+                if source in self._tasks:
+                    self._tasks[source].append(task)
+
+        def store(result):
+            with self._tasks_lock:
+                local_id, task.ID = task.ID, result['id']
+                if local_id in self._skipped_ids:
+                    self._skipped_ids.add(task.ID)
+                if result.get('status') != 'needsAction':
+                    return  # completed before it was made
+                self._record_local_change(list_id, task.ID)
+                with self._task_store.transaction():
+                    self._task_store.upsert(list_id, [(result['id'], result['title'], result.get('position'))])
+                tasks = self._tasks.get(source)
+                if tasks is None:
+                    return
+                if local_id in tasks:
+                    tasks.rename(local_id, task.ID)
+                elif update_locally and task.ID not in tasks:  # the list was loaded after the task was submitted
+                    tasks.append(task)
+
+        def store_then_call_on_success(result):
+            store(result)
+            if on_success:
+                on_success(result)
 
-        if not ignore_updating_locally:
-            self._tasks.append(Task(identifier=result['id'], title=title))
+        self._submit(lambda body: self._request('tasks', 'insert', self._TASK_FIELDS, account=account,
+                                                tasklist=list_id, body=body),
+                     {'title': title}, key=(list_id, task.ID), on_success=store_then_call_on_success,
+                     on_error=on_error, description='new task "{}"'.format(title))
+
+    def new_tasks(self, titles):
+        """
+        Makes new tasks in the first Google Tasks list of the current list using batch requests. The tasks are not
+        added to the loaded tasks.
 
-    def get_lists(self):
-        lists = self._service.tasklists().list(maxResults=1000).execute().get('items', [])
+        Args:
+            titles (dict(str, str)): the titles of the new tasks by a key of choice
+
+        Returns:
+            tuple(dict(str, dict), dict(str, Exception)): the new tasks returned by the Google Tasks API and the errors
+                of the tasks that could not be made, by key
+        """
+        account, list_id = self._sources(self._current_list)[0]
+        created, errors = self._execute_batch({
+            key: self._request('tasks', 'insert', self._TASK_FIELDS, account=account, tasklist=list_id,
+                               body={'title': title})
+            for key, title in titles.items()
+        })
+
+        with self._tasks_lock:
+            for task in created.values():
+                self._record_local_change(list_id, task['id'])
+            with self._task_store.transaction():
+                self._task_store.upsert(list_id, ((task['id'], task['title'], task.get('position'))
+                                                  for task in created.values()))
+        return created, errors
+
+    def get_lists(self, account=None):
+        """
+        Args:
+            account (str, optional): an account that is used in `TASK_LISTS`. Defaults to the account of
+                `credentials/token.json`.
+        """
+        lists = list(self._paginate('tasklists', self._LIST_PAGE_FIELDS, account=account, maxResults=self._PAGE_SIZE))
         return lists
 
     def get_tasks(self, force_reload=False):
@@ -48,83 +149,315 @@ class Inbox(GoogleAPI):
         List the tasks in the inbox
 
         Args:
-            force_reload (bool): if True, will reload the task list from the inbox using the Google Tasks API.
+            force_reload (bool): if True, will download the changes to the task list using the Google Tasks API.
                 If False, will only consult the Tasks API if the tasks have not yet been initialized.
+                When prefetching is enabled, the loaded tasks are returned right away and the changes are downloaded
+                in the background.
 
         Returns:
             list(Task): list of tasks in the inbox
         """
-        if self._tasks is None or force_reload:
-            tasks = self._service.tasks().list(tasklist=self._current_list_id, maxResults=1000).execute().get('items', [])
-            tasks = [task for task in tasks if task['status'] == 'needsAction']  # filter out recently completed
-            self._tasks = [Task(identifier=task['id'], title=task['title']) for task in tasks]
-        return self._tasks
+        task_lists = self._get_task_lists(force_reload=force_reload)
+        with self._tasks_lock:  # new tasks are renamed in the loaded tasks on the background thread
+            return list(itertools.chain.from_iterable(task_lists))
+
+    def _get_task_lists(self, force_reload=False):
+        """
+        Same as `get_tasks`, but returns the TaskList of every Google Tasks list of the current list, in order.
+        """
+        if self._first_load_done is not None and self._background_loader is not threading.current_thread():
+            self._first_load_done.wait()
+
+        sources = self._sources(self._current_list)
+        if any(source not in self._tasks for source in sources):
+            self._load(sources)
+        elif force_reload:
+            if PREFETCH_INTERVAL_SECONDS is None:
+                self._load(sources)
+            else:
+                self._prefetch_now.set()
+        with self._tasks_lock:
+            return [self._tasks[source] for source in sources]
+
+    def is_loading(self):
+        """
+        Returns: bool: whether the first tasks are still being loaded in the background
+        """
+        return self._first_load_done is not None and not self._first_load_done.is_set()
+
+    def _load(self, sources):
+        """
+        Loads Google Tasks lists at the same time, so that loading takes as long as the slowest list.
+
+        Args:
+            sources (list(tuple(str, str))): the account and ID of the Google Tasks lists
+        """
+        self._map_concurrently(self._load_source, sources)
+
+    def _load_source(self, source):
+        if not self._sync(source) and source in self._tasks:
+            return  # the loaded tasks are up to date
+        with self._tasks_lock:
+            self._tasks[source] = TaskList((Task(identifier=task_id, title=title) for task_id, title
+                                            in self._task_store.tasks(source[1])), self._skipped_ids)
+
+    def _load_in_background(self):
+        """
+        Loads the current list. When prefetching is enabled, all lists are then kept up to date, so that switching
+        and reloading lists does not have to wait for Google Tasks.
+        """
+        try:
+            self._load(self._sources(self._current_list))
+        finally:
+            self._first_load_done.set()
+
+        if PREFETCH_INTERVAL_SECONDS is None:
+            return
+        all_sources = list(dict.fromkeys(source for list_name in TASK_LISTS for source in self._sources(list_name)))
+        while True:
+            try:
+                self._load(all_sources)
+            except Exception as error:  # the next refresh tries again
+                print('Could not refresh tasks in the background:', error)
+            self._prefetch_now.wait(PREFETCH_INTERVAL_SECONDS)
+            self._prefetch_now.clear()
+
+    def _sync(self, source):
+        """
+        Brings the local copy of a Google Tasks list up to date. The first synchronization downloads all unfinished
+        tasks. After that, only the tasks that were updated since the previous synchronization are downloaded,
+        including deleted, hidden and completed tasks so that they can be removed from the local copy.
+
+        The time from which changes are downloaded is only moved forward when there were changes, so that a
+        synchronization without changes makes the same request as the previous one, to which Google can respond with
+        304 Not Modified.
+
+        Pages that Google did not send again because they did not change since the previous synchronization are not
+        applied again. When a synchronization fails, pages may have been stored without being applied, so the next
+        synchronization downloads and applies all unfinished tasks again.
+
+        Tasks that are changed locally while the changes are downloaded are left as they are, because the downloaded
+        pages may not include the local change yet.
+
+        Args:
+            source (tuple(str, str)): the account and ID of the Google Tasks list
+
+        Returns: bool: whether tasks were changed
+        """
+        account, list_id = source
+        self.wait_for_writes()  # otherwise, tasks completed in the background could be downloaded again
+        updated_min = self._task_store.updated_min(list_id)
+        sync_start = datetime.datetime.utcnow() - self._SYNC_MARGIN
+        if updated_min:
+            query = {'updatedMin': updated_min, 'showCompleted': True, 'showDeleted': True, 'showHidden': True}
+        else:
+            query = {'showCompleted': False}
+
+        with self._tasks_lock:
+            self._syncs_in_progress += 1
+            download_start = next(self._local_change_numbers)
+        try:
+            # downloaded before the transaction, which would keep other lists from being stored in the meantime
+            responses = list(self._paginate_responses('tasks', self._TASK_PAGE_FIELDS, account=account,
+                                                      tasklist=list_id, maxResults=self._PAGE_SIZE, **query))
+            with self._tasks_lock:  # no local changes are made until the pages are applied
+                changed_locally = {task_id for (changed_list_id, task_id), number in self._local_changes.items()
+                                   if changed_list_id == list_id and number > download_start}
+                return self._apply_pages(list_id, responses, changed_locally, updated_min, sync_start)
+        except Exception:
+            if updated_min:
+                with self._task_store.transaction():
+                    self._task_store.set_updated_min(list_id, None)
+            raise
+        finally:
+            with self._tasks_lock:
+                self._syncs_in_progress -= 1
+                if not self._syncs_in_progress:
+                    self._local_changes.clear()  # synchronizations that start later download the local changes
+
+    def _apply_pages(self, list_id, responses, changed_locally, updated_min, sync_start):
+        """
+        Stores the downloaded pages of tasks of a Google Tasks list, see `_sync`.
+
+        Args:
+            changed_locally (set(str)): IDs of the tasks that were changed locally since the download started
+        """
+        changed = not updated_min
+        with self._task_store.transaction():
+            if not updated_min:
+                self._task_store.clear(list_id, keep=changed_locally)
+            for response in responses:
+                if updated_min and isinstance(response, NotModified):
+                    continue  # applied by an earlier synchronization
+                tasks = response.get('items', [])
+                changed = changed or bool(tasks)
+                tasks = [task for task in tasks if task['id'] not in changed_locally]
+                unfinished = [task for task in tasks if task['status'] == 'needsAction' and not task.get('deleted')]
+                self._task_store.delete(list_id, (task['id'] for task in tasks if task not in unfinished))
+                self._task_store.upsert(list_id, ((task['id'], task['title'], task.get('position'))
+                                                  for task in unfinished))
+            if changed:
+                self._task_store.set_updated_min(list_id, sync_start.strftime(self._RFC_3339_DATETIME_FORMAT))
+        return changed
 
     def get_task(self):
-        for task in self.get_tasks():
-            if task not in self._ignored_tasks:
-                self.current_task = task
-                return task
+        task_lists = self._get_task_lists()
+        with self._tasks_lock:
+            self.current_task = next(filter(None, (tasks.first_unskipped() for tasks in task_lists)), None)
+        return self.current_task
 
     @_check_task_exists
     def skip_task(self):
-        self._ignored_tasks.append(self.current_task)
+        with self._tasks_lock:
+            self._skipped_ids.add(self.current_task.ID)
+            self._tasks[self._source_of(self.current_task)].skip(self.current_task.ID)
 
     @_check_task_exists
-    def complete_task(self):
-        self._service.tasks().patch(tasklist=self._current_list_id, task=self.current_task.ID,
-                                    body={'status': 'completed'}).execute()
+    def complete_task(self, after=None):
+        """
+        Completes the current task right away in the loaded tasks, and in Google Tasks in the background. If Google Tasks
+        could not complete the task, it is restored in the loaded tasks.
+
+        Args:
+            after (callable, optional): function of an `on_success` and an `on_error` callback that sends a mutation in
+                the background, like scheduling the task in the calendar. The task is only completed in Google Tasks
+                once that mutation succeeded, so that the task is not lost when it failed. It is restored in the loaded
+                tasks when the mutation failed.
+        """
+        task, source = self.current_task, self._source_of(self.current_task)
+        account, list_id = source
+        with self._tasks_lock:
+            self._record_local_change(list_id, task.ID)
+            row = self._task_store.task(list_id, task.ID)
+            with self._task_store.transaction():
+                self._task_store.delete(list_id, [task.ID])
+            self._tasks[source].remove(task.ID)
 
-        self._tasks = [task for task in self._tasks if task != self.current_task]
+        def complete(response=None):
+            self._submit(lambda body: self._request('tasks', 'patch', 'id', account=account, tasklist=list_id,
+                                                    task=task.ID, body=body),
+                         {'status': 'completed'}, key=(list_id, task.ID),
+                         on_error=lambda error: self._restore_task(source, row),
+                         description='complete task "{}"'.format(task.title))
+
+        if after is None:
+            complete()
+        else:
+            after(complete, lambda error: self._restore_task(source, row))
 
     @_check_task_exists
     def edit_task(self, new_title):
-        self._service.tasks().patch(tasklist=self._current_list_id, task=self.current_task.ID,
-                                    body={'title': new_title}).execute()
+        """
+        Changes the title of the current task right away in the loaded tasks, and in Google Tasks in the background. If
+        Google Tasks could not change the title, the previous title is restored in the loaded tasks.
+        """
+        task, (account, list_id) = self.current_task, self._source_of(self.current_task)
+        with self._tasks_lock:
+            self._record_local_change(list_id, task.ID)
+            old_title = task.title
+            with self._task_store.transaction():
+                self._task_store.set_title(list_id, task.ID, new_title)
+            task.title = new_title
+
+        def on_error(error):
+            with self._tasks_lock:
+                if task.title != new_title:
+                    return  # changed again since
+                with self._task_store.transaction():
+                    self._task_store.set_title(list_id, task.ID, old_title)
+                task.title = old_title
 
-        self.current_task.title = new_title
+        self._submit(lambda body: self._request('tasks', 'patch', 'id', account=account, tasklist=list_id,
+                                                task=task.ID, body=body),
+                     {'title': new_title}, key=(list_id, task.ID), on_error=on_error,
+                     description='edit task "{}"'.format(new_title))
 
-    def _get_list_id(self, task_list):
-        task_id = LIST_IDS.get(task_list)
-        if not task_id:
-            raise ValueError("list {} should be in {}".format(task_list, list(LIST_IDS.keys())))
-        return task_id
+    def _restore_task(self, source, row):
+        """
+        Stores a task again after Google Tasks could not complete it, and puts it back in its place in the loaded tasks.
+
+        Args:
+            source (tuple(str, str)): the account and ID of the Google Tasks list
+            row (tuple(str, str, str) or None): the task as (id, title, position), or None if it was not stored yet
+        """
+        with self._tasks_lock:
+            if row is not None:
+                with self._task_store.transaction():
+                    self._task_store.upsert(source[1], [row])
+            tasks = self._tasks.get(source)
+            if tasks is None:
+                return
+            # the loaded tasks are kept, so that changes that are still being sent apply to them. New tasks that
+            # Google Tasks has not made yet are not stored, they are kept at the end.
+            loaded = {task.ID: task for task in tasks}
+            new_tasks = [task for task in tasks if task.ID.startswith(self._LOCAL_ID_PREFIX)]
+            self._tasks[source] = TaskList(itertools.chain(
+                (loaded.get(task_id) or Task(identifier=task_id, title=title)
+                 for task_id, title in self._task_store.tasks(source[1])),
+                new_tasks), self._skipped_ids)
+
+    def _record_local_change(self, list_id, task_id):
+        """
+        Remembers that a task was changed locally, so that synchronizations in progress do not overwrite the change.
+        """
+        with self._tasks_lock:
+            if self._syncs_in_progress:
+                self._local_changes[list_id, task_id] = next(self._local_change_numbers)
+
+    @staticmethod
+    def _sources(list_name):
+        """
+        Returns: list(tuple(str, str)): the account and ID of the Google Tasks lists of a list of `TASK_LISTS`, in order.
+            The account of `credentials/token.json` is None.
+        """
+        sources = TASK_LISTS.get(list_name)
+        if not sources:
+            raise ValueError("list {} should be in {}".format(list_name, list(TASK_LISTS.keys())))
+        return [source if isinstance(source, tuple) else (None, source) for source in sources]
+
+    def _source_of(self, task):
+        """
+        Returns: tuple(str, str): the account and ID of the Google Tasks list of a task of the current list
+        """
+        with self._tasks_lock:
+            for source in self._sources(self._current_list):
+                if task.ID in self._tasks.get(source, ()):
+                    return source
+        raise ValueError('Task "{}" is not in list {}'.format(task.title, self._current_list))
 
     def set_current_list(self, task_list, force_reload=True):
         """
-        Sets the current list to the inbox or the waiting list.
+        Sets the current list to a list of `TASK_LISTS`, like the inbox or the waiting list.
 
         Args:
             task_list (str):
                 `inbox` for the inbox
                 `waiting` for the waiting list
                 `previous` for the previous list value
+                or the name of another list of `TASK_LISTS`
             force_reload (bool): whether to reload the task list from Google Tasks. When set to False, reloading will not happen after calling this function, unless it is the first time requesting tasks.
         """
         if task_list == 'previous':
-            if self._current_list_id == self._previous_list_id:
+            if self._current_list == self._previous_list:
                 return
-            self._current_list_id, self._previous_list_id = copy.deepcopy(self._previous_list_id), copy.deepcopy(self._current_list_id)
+            self._current_list, self._previous_list = self._previous_list, self._current_list
         else:
-            list_id = self._get_list_id(task_list)
-            if self._current_list_id == list_id:
+            self._sources(task_list)  # validates the name
+            if self._current_list == task_list:
                 return
-            self._current_list_id, self._previous_list_id = list_id, copy.deepcopy(self._current_list_id)
+            self._current_list, self._previous_list = task_list, self._current_list
 
-        self.get_tasks(force_reload=force_reload)
+        self._get_task_lists(force_reload=force_reload)
 
     def get_current_list(self):
-        for list_name, list_id in LIST_IDS.items():
-            if list_id == self._current_list_id:
-                return list_name
+        return self._current_list
 
     @_check_task_exists
     def move_task_to_list(self, to_list):
-        if self._current_list_id == self._get_list_id(to_list):
+        if self._current_list == to_list:
             print('Task "{}" is already in list {}'.format(self.current_task.title, to_list))
             return
 
-        self.set_current_list(to_list, force_reload=False)
-        self.new_task(self.current_task.title, ignore_updating_locally=True)
-        self.set_current_list('previous', force_reload=False)
-        self.complete_task()
+        to_source, title = self._sources(to_list)[0], self.current_task.title
+        self.complete_task(after=lambda on_success, on_error: self._new_task_in_list(
+            to_source, title, on_success=on_success, on_error=on_error))
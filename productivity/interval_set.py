@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import datetime
+from typing import Iterable, List
+
+import numpy as np
+
+from productivity.datetime_interval import DatetimeInterval
+
+_EPOCH_NAIVE = datetime.datetime(1970, 1, 1)
+_EPOCH_AWARE = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class IntervalSet:
+    """
+    Set of disjoint, non-bordering intervals, stored as sorted int64 arrays of microseconds since the epoch.
+
+    Datetimes are either all naive or all timezone-aware. Aware datetimes are converted to UTC, so intervals returned
+    by `to_intervals` are in UTC.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, aware: bool = True):
+        """
+        Args:
+            starts (numpy.ndarray): int64 start times in microseconds since the epoch
+            ends (numpy.ndarray): int64 end times in microseconds since the epoch
+            aware (bool): whether the epoch times represent timezone-aware datetimes (in UTC) or naive datetimes
+        """
+        self.starts, self.ends = self._normalize(np.asarray(starts, dtype=np.int64),
+                                                 np.asarray(ends, dtype=np.int64))
+        self.aware = aware
+
+    @staticmethod
+    def _normalize(starts: np.ndarray, ends: np.ndarray):
+        """
+        Sorts the intervals, drops empty intervals and merges overlapping or bordering intervals.
+        """
+        if starts.shape != ends.shape:
+            raise ValueError('Starts and ends of IntervalSet must have the same shape,'
+                             ' not %s and %s, respectively.' % (starts.shape, ends.shape))
+        non_empty = starts < ends
+        starts, ends = starts[non_empty], ends[non_empty]
+        if not starts.size:
+            return starts, ends
+
+        order = np.argsort(starts, kind='stable')
+        starts, ends = starts[order], ends[order]
+        running_end = np.maximum.accumulate(ends)
+        new_group = np.empty(starts.size, dtype=bool)
+        new_group[0] = True
+        new_group[1:] = starts[1:] > running_end[:-1]
+        group_indices = np.flatnonzero(new_group)
+        return starts[group_indices], np.maximum.reduceat(ends, group_indices)
+
+    @classmethod
+    def from_intervals(cls, intervals: Iterable[DatetimeInterval]) -> IntervalSet:
+        return cls.from_datetimes((interval.start, interval.end) for interval in intervals)
+
+    @classmethod
+    def from_datetimes(cls, start_end_pairs: Iterable) -> IntervalSet:
+        """
+        Args:
+            start_end_pairs (iterable(tuple(datetime.datetime, datetime.datetime))): starts and ends of the intervals.
+                The iterable is consumed once, so a generator can be passed without materializing it.
+        """
+        starts, ends = [], []
+        aware = None
+        for start, end in start_end_pairs:
+            if aware is None:
+                aware = start.tzinfo is not None
+            starts.append(cls.to_epoch(start, aware))
+            ends.append(cls.to_epoch(end, aware))
+        return cls(np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64),
+                   aware=True if aware is None else aware)
+
+    @staticmethod
+    def to_epoch(value: datetime.datetime, aware: bool = True) -> int:
+        if not isinstance(value, datetime.datetime):
+            raise ValueError('IntervalSet can only be built from datetime.datetime, not %s' % type(value))
+        if (value.tzinfo is not None) != aware:
+            raise ValueError('Naive and timezone-aware datetimes cannot be mixed in an IntervalSet')
+        return (value - (_EPOCH_AWARE if aware else _EPOCH_NAIVE)) // _MICROSECOND
+
+    def to_datetime(self, value) -> datetime.datetime:
+        return (_EPOCH_AWARE if self.aware else _EPOCH_NAIVE) + datetime.timedelta(microseconds=int(value))
+
+    def to_intervals(self) -> List[DatetimeInterval]:
+        return [DatetimeInterval(self.to_datetime(start), self.to_datetime(end))
+                for start, end in zip(self.starts.tolist(), self.ends.tolist())]
+
+    def __len__(self):
+        return int(self.starts.size)
+
+    def __bool__(self):
+        return bool(self.starts.size)
+
+    def __iter__(self):
+        return iter(self.to_intervals())
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            raise ValueError('IntervalSet objects cannot be compared to objects of type %s' % type(other))
+        return (np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+                and (self.aware == other.aware or not self))
+
+    def __repr__(self):
+        return 'IntervalSet(%s)' % self.to_intervals()
+
+    def minutes(self) -> np.ndarray:
+        return (self.ends - self.starts) / 60e6
+
+    def _check_compatible(self, other: IntervalSet):
+        if self and other and self.aware != other.aware:
+            raise ValueError('Naive and timezone-aware IntervalSets cannot be combined')
+
+    def _combine(self, other: IntervalSet, keep) -> IntervalSet:
+        """
+        Sweeps over all boundaries of self and other, keeping the elementary segments for which
+        `keep(covered_by_self, covered_by_other)` is True.
+        """
+        self._check_compatible(other)
+        boundaries = np.unique(np.concatenate([self.starts, self.ends, other.starts, other.ends]))
+        if boundaries.size < 2:
+            return IntervalSet(boundaries[:0], boundaries[:0], aware=self.aware if self else other.aware)
+
+        segment_starts = boundaries[:-1]
+        in_self = (np.searchsorted(self.starts, segment_starts, side='right')
+                   > np.searchsorted(self.ends, segment_starts, side='right'))
+        in_other = (np.searchsorted(other.starts, segment_starts, side='right')
+                    > np.searchsorted(other.ends, segment_starts, side='right'))
+        kept = keep(in_self, in_other)
+        return IntervalSet(segment_starts[kept], boundaries[1:][kept], aware=self.aware if self else other.aware)
+
+    def union(self, other: IntervalSet) -> IntervalSet:
+        self._check_compatible(other)
+        return IntervalSet(np.concatenate([self.starts, other.starts]), np.concatenate([self.ends, other.ends]),
+                           aware=self.aware if self else other.aware)
+
+    def intersection(self, other: IntervalSet) -> IntervalSet:
+        return self._combine(other, np.logical_and)
+
+    def difference(self, other: IntervalSet) -> IntervalSet:
+        return self._combine(other, lambda in_self, in_other: in_self & ~in_other)
+
+    def complement(self, start: datetime.datetime, end: datetime.datetime) -> IntervalSet:
+        """
+        Calculates the free space between the intervals of self, within the period from start until end.
+        """
+        return IntervalSet.from_datetimes([(start, end)]).difference(self)
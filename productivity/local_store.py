@@ -0,0 +1,206 @@
+import contextlib
+import json
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Local store persisted in a SQLite database. Changes are committed by wrapping them in `transaction()`.
+    The store can be used from multiple threads: transactions and queries are serialized by a lock.
+    """
+    _SCHEMA = ''
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): path of the SQLite database. Use ':memory:' for a store that is not persisted.
+        """
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._connection:
+            self._connection.executescript(
+                'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);' + self._SCHEMA)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Returns: context manager that commits the changes made within it, or rolls them back on an exception
+        """
+        with self._lock, self._connection:
+            yield
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _get_meta(self, key):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key,))
+        return rows[0][0] if rows else None
+
+    def _set_meta(self, key, value):
+        self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+class EventStore(SQLiteStore):
+    """
+    Local copy of calendar events. All-day events have a start and end date, other events have a start and end time
+    in microseconds since the epoch (UTC).
+    """
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS events (
+            id TEXT PRIMARY KEY,
+            summary TEXT,
+            start_date TEXT,
+            end_date TEXT,
+            start INTEGER,
+            end INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS events_by_start_date ON events (start_date);
+        CREATE INDEX IF NOT EXISTS events_by_start ON events (start);
+    '''
+
+    @property
+    def sync_token(self):
+        return self._get_meta('sync_token')
+
+    @sync_token.setter
+    def sync_token(self, value):
+        self._set_meta('sync_token', value)
+
+    def upsert(self, rows):
+        """
+        Args:
+            rows (iterable(tuple)): events as (id, summary, start_date, end_date, start, end)
+        """
+        self._connection.executemany('INSERT OR REPLACE INTO events (id, summary, start_date, end_date, start, end)'
+                                     ' VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def delete(self, event_ids):
+        self._connection.executemany('DELETE FROM events WHERE id = ?', ((event_id,) for event_id in event_ids))
+
+    def clear(self):
+        self._connection.execute('DELETE FROM events')
+        self._set_meta('sync_token', None)
+
+    def all_day_events(self, start_date, end_date):
+        """
+        Args:
+            start_date (str): 'YYYY-MM-DD', events ending on or before this date are excluded
+            end_date (str): 'YYYY-MM-DD', events starting after this date are excluded
+
+        Returns: list(tuple(str, str)): ID and summary of the all-day events
+        """
+        return self._query('SELECT id, summary FROM events WHERE start_date <= ? AND end_date > ? ORDER BY start_date',
+                           (end_date, start_date))
+
+    def timed_events(self, start, end):
+        """
+        Args:
+            start (int): microseconds since the epoch, events ending on or before this time are excluded
+            end (int): microseconds since the epoch, events starting on or after this time are excluded
+
+        Returns: list(tuple(int, int)): start and end of the events in microseconds since the epoch
+        """
+        return self._query('SELECT start, end FROM events WHERE start_date IS NULL AND start < ? AND end > ?',
+                           (end, start))
+
+
+class TaskStore(SQLiteStore):
+    """
+    Local copy of the unfinished tasks of Google Tasks lists, with the time from which changes still have to be
+    downloaded per list.
+    """
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS tasks (
+            list_id TEXT,
+            id TEXT,
+            title TEXT,
+            position TEXT,
+            PRIMARY KEY (list_id, id)
+        );
+    '''
+
+    def updated_min(self, list_id):
+        return self._get_meta('updated_min:' + list_id)
+
+    def set_updated_min(self, list_id, value):
+        self._set_meta('updated_min:' + list_id, value)
+
+    def upsert(self, list_id, rows):
+        """
+        Args:
+            list_id (str): ID of the Google Tasks list
+            rows (iterable(tuple)): tasks as (id, title, position)
+        """
+        self._connection.executemany('INSERT OR REPLACE INTO tasks (list_id, id, title, position)'
+                                     ' VALUES (?, ?, ?, ?)', ((list_id,) + tuple(row) for row in rows))
+
+    def set_title(self, list_id, task_id, title):
+        self._connection.execute('UPDATE tasks SET title = ? WHERE list_id = ? AND id = ?', (title, list_id, task_id))
+
+    def delete(self, list_id, task_ids):
+        self._connection.executemany('DELETE FROM tasks WHERE list_id = ? AND id = ?',
+                                     ((list_id, task_id) for task_id in task_ids))
+
+    def clear(self, list_id, keep=()):
+        """
+        Args:
+            list_id (str): ID of the Google Tasks list
+            keep (iterable(str), optional): IDs of tasks that are not removed
+        """
+        keep = list(keep)
+        self._connection.execute('DELETE FROM tasks WHERE list_id = ? AND id NOT IN ({})'
+                                 .format(', '.join('?' * len(keep))), [list_id] + keep)
+        self.set_updated_min(list_id, None)
+
+    def task(self, list_id, task_id):
+        """
+        Returns: tuple(str, str, str) or None: the task as (id, title, position), or None if it is not stored
+        """
+        rows = self._query('SELECT id, title, position FROM tasks WHERE list_id = ? AND id = ?', (list_id, task_id))
+        return rows[0] if rows else None
+
+    def tasks(self, list_id):
+        """
+        Returns: list(tuple(str, str)): ID and title of the tasks in the list, in the order of Google Tasks
+        """
+        return self._query('SELECT id, title FROM tasks WHERE list_id = ? ORDER BY position, id', (list_id,))
+
+
+class ResponseStore(SQLiteStore):
+    """
+    Responses of GET requests with their ETag, by URI, so that a request can ask Google to only send the response if
+    it changed. Only the most recently stored responses are kept.
+    """
+    _SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS responses (
+            uri TEXT PRIMARY KEY,
+            etag TEXT,
+            body TEXT,
+            stored INTEGER
+        );
+    '''
+    _MAX_RESPONSES = 1000
+
+    def etag(self, uri):
+        """
+        Returns: str or None: the ETag of the response of the URI, or None if it was not stored
+        """
+        rows = self._query('SELECT etag FROM responses WHERE uri = ?', (uri,))
+        return rows[0][0] if rows else None
+
+    def get(self, uri):
+        """
+        Returns: tuple(str, dict) or None: the ETag and the response of the URI, or None if it was not stored
+        """
+        rows = self._query('SELECT etag, body FROM responses WHERE uri = ?', (uri,))
+        return (rows[0][0], json.loads(rows[0][1])) if rows else None
+
+    def put(self, uri, etag, response):
+        with self.transaction():
+            self._connection.execute('INSERT OR REPLACE INTO responses (uri, etag, body, stored) VALUES'
+                                     ' (?, ?, ?, (SELECT COALESCE(MAX(stored), 0) + 1 FROM responses))',
+                                     (uri, etag, json.dumps(response)))
+            self._connection.execute('DELETE FROM responses WHERE stored <= (SELECT MAX(stored) FROM responses) - ?',
+                                     (self._MAX_RESPONSES,))
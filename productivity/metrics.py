@@ -0,0 +1,143 @@
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+from productivity.config import METRICS_FILE
+
+
+class _Statistics:
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.errors = 0
+        self.calls = 0  # calls to Google, a batch request makes several calls
+        self.seconds = 0.0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.histogram = [0] * bucket_count
+
+
+class Metrics:
+    """
+    Counts, latency histograms and transferred bytes of measured operations, by name. Names are like
+    'tasks.tasks.list' for calls to Google, 'credentials' for loading credentials and 'command ic' for console
+    commands. Measurements can also be appended to a file as JSON lines, for offline analysis.
+    """
+    # upper bounds of the latency histogram buckets in seconds, the last bucket has no upper bound
+    _BUCKET_BOUNDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str, optional): if given, every measurement is appended to this file as a JSON line
+        """
+        self._path = path
+        self._statistics = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    def record(self, name, seconds, bytes_sent=0, bytes_received=0, calls=0, error=False):
+        """
+        Args:
+            name (str): the name of the operation
+            seconds (float): the duration of the operation
+            bytes_sent (int, optional): the number of bytes sent to Google
+            bytes_received (int, optional): the number of bytes received from Google
+            calls (int, optional): the number of calls to Google that count towards the quota
+            error (bool, optional): whether the operation failed
+        """
+        with self._lock:
+            statistics = self._statistics.get(name)
+            if statistics is None:
+                statistics = self._statistics[name] = _Statistics(len(self._BUCKET_BOUNDS) + 1)
+            statistics.count += 1
+            statistics.errors += bool(error)
+            statistics.calls += calls
+            statistics.seconds += seconds
+            statistics.bytes_sent += bytes_sent
+            statistics.bytes_received += bytes_received
+            statistics.histogram[bisect.bisect_left(self._BUCKET_BOUNDS, seconds)] += 1
+
+            if self._path:
+                with open(self._path, 'a') as f:
+                    f.write(json.dumps({'time': time.time(), 'name': name, 'seconds': seconds,
+                                        'bytes_sent': bytes_sent, 'bytes_received': bytes_received, 'calls': calls,
+                                        'error': bool(error)}) + '\n')
+
+    @contextlib.contextmanager
+    def measure(self, name):
+        """
+        Returns: context manager that records the duration of the code within it, and whether it raised an exception
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(name, time.perf_counter() - start, error=True)
+            raise
+        self.record(name, time.perf_counter() - start)
+
+    def percentile(self, name, fraction):
+        """
+        Returns: float or None: the upper bound of the histogram bucket that contains the percentile of the duration,
+            infinity for the last bucket, or None if nothing was measured with the name
+        """
+        with self._lock:
+            statistics = self._statistics.get(name)
+            if statistics is None:
+                return None
+            rank = fraction * statistics.count
+            cumulative = 0
+            for bound, count in zip(self._BUCKET_BOUNDS + (float('inf'),), statistics.histogram):
+                cumulative += count
+                if cumulative >= rank:
+                    return bound
+
+    def snapshot(self):
+        """
+        Returns: dict(str, dict): the statistics by name
+        """
+        with self._lock:
+            return {name: dict(vars(statistics), histogram=list(statistics.histogram))
+                    for name, statistics in self._statistics.items()}
+
+    def summary(self):
+        """
+        Returns: str: a table of the statistics, followed by the number of calls to Google per API per minute
+        """
+        snapshot = self.snapshot()
+        lines = ['{:<32} {:>6} {:>6} {:>6} {:>9} {:>8} {:>8} {:>10}'.format(
+            'name', 'count', 'errors', 'calls', 'mean ms', 'p50 ms', 'p95 ms', 'kB in')]
+        for name, statistics in sorted(snapshot.items()):
+            lines.append('{:<32} {:>6} {:>6} {:>6} {:>9.1f} {:>8} {:>8} {:>10.1f}'.format(
+                name, statistics['count'], statistics['errors'], statistics['calls'],
+                1000 * statistics['seconds'] / statistics['count'],
+                self._format_bound(self.percentile(name, 0.5)), self._format_bound(self.percentile(name, 0.95)),
+                statistics['bytes_received'] / 1000))
+
+        minutes = max((time.time() - self._started) / 60, 1)
+        calls_per_api = {}
+        for name, statistics in snapshot.items():
+            api = name.split('.')[0]
+            calls_per_api[api] = calls_per_api.get(api, 0) + statistics['calls']
+        for api, calls in sorted(calls_per_api.items()):
+            if calls:
+                lines.append('{} API: {} calls, {:.1f} per minute'.format(api, calls, calls / minutes))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _format_bound(bound):
+        if bound is None:
+            return '-'
+        if bound == float('inf'):
+            return '>{:g}'.format(1000 * Metrics._BUCKET_BOUNDS[-1])
+        return '<{:g}'.format(1000 * bound)
+
+    def reset(self):
+        with self._lock:
+            self._statistics = {}
+            self._started = time.time()
+
+
+metrics = Metrics(METRICS_FILE)  # shared by the services and the console
@@ -0,0 +1,53 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Client-side rate limiter. Tokens are added at a constant rate, up to a burst capacity, and every call takes a
+    token. Callers that find no token left wait until their token has been added, in the order in which they arrived.
+    A caller can take more tokens than the capacity, for example for a batch request, and then waits longer.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): the number of tokens that are added per second
+            capacity (float, optional): the maximum number of tokens that can be taken without waiting. Defaults to
+                the rate, so a burst of one second.
+        """
+        if rate <= 0:
+            raise ValueError('rate {} should be positive'.format(rate))
+        self._rate = rate
+        self._capacity = rate if capacity is None else capacity
+        self._tokens = self._capacity  # negative when callers are waiting for tokens that have not been added yet
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Takes tokens, and waits until they have been added if there are not enough.
+
+        Returns: float: the number of seconds waited
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            wait_seconds = max(-self._tokens / self._rate, 0)
+        if wait_seconds:
+            time.sleep(wait_seconds)
+        return wait_seconds
+
+    def pause(self, seconds):
+        """
+        Makes sure that no tokens are available during the coming seconds, for example after Google has responded that
+        the rate limit is exceeded. Callers that are already waiting are not delayed further.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self._rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._updated) * self._rate, self._capacity)
+        self._updated = now
@@ -0,0 +1,45 @@
+import httplib2
+import requests.adapters
+from google.auth.transport.requests import AuthorizedSession
+
+
+class SessionHttp:
+    """
+    httplib2-compatible transport on a pooled `google.auth.transport.requests.AuthorizedSession`, so that one transport
+    can be shared by all services and threads. Connections are kept alive per host and reused by later calls, so the
+    TLS handshake is done once per connection instead of once per thread and service. Credentials are refreshed by
+    the session when they expire.
+    """
+
+    def __init__(self, credentials, pool_size=10):
+        """
+        Args:
+            credentials (google.auth.credentials.Credentials): the credentials that authorize the calls
+            pool_size (int, optional): the maximum number of connections that are kept alive per host, which is also
+                the number of threads that can make calls to a host at the same time without waiting for a connection
+        """
+        self._session = AuthorizedSession(credentials)
+        # Google compresses responses only for user agents that contain 'gzip'. googleapiclient asks for this itself,
+        # but not for the outer request of a batch.
+        self._session.headers.update({'User-Agent': 'productivity (gzip)', 'Accept-Encoding': 'gzip'})
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        """
+        Same as `httplib2.Http.request`.
+
+        Returns: tuple(httplib2.Response, bytes): the response and its decompressed body
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        response = self._session.request(method, uri, data=body, headers=headers,
+                                         allow_redirects=redirections > 0)
+        response_headers = {key.lower(): value for key, value in response.headers.items()}
+        response_headers.pop('content-encoding', None)  # the body has already been decompressed
+        response_headers['status'] = str(response.status_code)
+        return httplib2.Response(response_headers), response.content
+
+    def close(self):
+        self._session.close()
@@ -2,16 +2,28 @@ import re
 
 from productivity.config import DEFAULT_TASK_LENGTH
 
+_HASHTAG_PATTERN = re.compile(r'#[a-z0-9]+\b')
+_HASHTAG_MINUTES_PATTERN = re.compile(r'#([0-9]+)min\b')
+
 
 class Task:
     DONE_HASHTAG = '#done'
-    _HASHTAG_REGEX = r'#[a-z0-9]+\b'
-    _HASHTAG_MINUTES_REGEX = r'#([0-9]+)min\b'
+    # the hashtags of the title are parsed once, and parsed again only when the title changes
+    __slots__ = ('ID', '_title', '_tags', '_minutes', '_done')
 
     def __init__(self, identifier, title):
         self.ID = identifier
         self.title = title
 
+    @property
+    def title(self):
+        return self._title
+
+    @title.setter
+    def title(self, title):
+        self._title = title
+        self._tags = None
+
     def __repr__(self):
         return self.title
 
@@ -22,18 +34,28 @@ class Task:
             return False
         return True
 
+    def _parse_hashtags(self):
+        lower_title = self._title.lower()
+        self._tags = _HASHTAG_PATTERN.findall(lower_title)
+        self._done = self.DONE_HASHTAG in self._tags
+
+        matching_minutes = _HASHTAG_MINUTES_PATTERN.search(lower_title)
+        self._minutes = int(matching_minutes.group(1)) if matching_minutes else DEFAULT_TASK_LENGTH
+
     def tags(self):
-        return re.findall(self._HASHTAG_REGEX, self.title.lower())
+        if self._tags is None:
+            self._parse_hashtags()
+        return list(self._tags)
 
     def minutes(self):
-        matching_minutes = re.search(self._HASHTAG_MINUTES_REGEX, self.title.lower())
-        if not matching_minutes:
-            return DEFAULT_TASK_LENGTH
-
-        return int(matching_minutes.group(1))
+        if self._tags is None:
+            self._parse_hashtags()
+        return self._minutes
 
     def is_done(self):
-        return self.DONE_HASHTAG in self.tags()
+        if self._tags is None:
+            self._parse_hashtags()
+        return self._done
 
     def complete(self):
         self.title = self.DONE_HASHTAG + ' ' + self.title
@@ -0,0 +1,56 @@
+from collections import OrderedDict
+
+
+class TaskList:
+    """
+    Tasks of a list in order, keyed by task ID. Finding the first task that is not skipped, skipping, adding and
+    removing a task take constant time.
+    """
+
+    def __init__(self, tasks=(), skipped_ids=()):
+        """
+        Args:
+            tasks (iterable(Task)): the tasks in order
+            skipped_ids (set(str)): IDs of the tasks that are skipped
+        """
+        self._tasks = OrderedDict()
+        self._unskipped = OrderedDict()
+        for task in tasks:
+            self._tasks[task.ID] = task
+            if task.ID not in skipped_ids:
+                self._unskipped[task.ID] = task
+
+    def __iter__(self):
+        return iter(self._tasks.values())
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def first_unskipped(self):
+        """
+        Returns: Task or None: the first task that is not skipped, or None if all tasks are skipped
+        """
+        return next(iter(self._unskipped.values()), None)
+
+    def append(self, task):
+        self._tasks[task.ID] = task
+        self._unskipped[task.ID] = task
+
+    def remove(self, task_id):
+        self._tasks.pop(task_id, None)
+        self._unskipped.pop(task_id, None)
+
+    def skip(self, task_id):
+        self._unskipped.pop(task_id, None)
+
+    def rename(self, old_task_id, new_task_id):
+        """
+        Changes the key of a task whose ID has changed. The task moves to the end of the list, like new tasks.
+        """
+        task = self._tasks.pop(old_task_id)
+        self._tasks[new_task_id] = task
+        if self._unskipped.pop(old_task_id, None) is not None:
+            self._unskipped[new_task_id] = task
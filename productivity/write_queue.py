@@ -0,0 +1,97 @@
+import collections
+import threading
+
+
+class _Operation:
+    def __init__(self, run, body, key, on_success, on_error, description):
+        self.run = run
+        self.body = body
+        self.key = key
+        self.on_success = [on_success] if on_success else []
+        self.on_error = [on_error] if on_error else []
+        self.description = description
+
+
+class WriteBehindQueue:
+    """
+    Executes mutations on a background thread, in the order in which they were submitted. An operation is coalesced
+    into a waiting operation with the same key if no other operation was submitted in between, for example an edit
+    followed by a complete of the same task. This keeps the order: a complete is never executed before an operation
+    that was submitted before it. Operations are executed once: the run function is responsible for retrying temporary
+    errors.
+    """
+    def __init__(self):
+        self._operations = collections.deque()
+        self._waiting_by_key = {}
+        self._busy = False
+        self._errors = []
+        self._condition = threading.Condition()
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, run, body, key=None, on_success=None, on_error=None, description=''):
+        """
+        Args:
+            run (callable): function of the body that executes the operation and returns the response. The function is
+                only called when the operation is executed, so it can use IDs that became known in earlier operations.
+            body (dict): the body of the operation
+            key (hashable, optional): if the last waiting operation has the same key, the body is merged into the
+                body of the waiting operation instead of adding a new operation
+            on_success (callable, optional): called with the response once the operation has been executed
+            on_error (callable, optional): called with the error if the operation failed. The functions of coalesced
+                operations are called in the reverse order in which they were submitted, so that they can undo changes.
+            description (str, optional): description of the operation, used when reporting errors
+        """
+        with self._condition:
+            waiting = self._waiting_by_key.get(key) if key is not None else None
+            if waiting and self._operations[-1] is waiting:
+                waiting.body.update(body)
+                if on_success:
+                    waiting.on_success.append(on_success)
+                if on_error:
+                    waiting.on_error.append(on_error)
+                return
+
+            operation = _Operation(run, dict(body), key, on_success, on_error, description)
+            self._operations.append(operation)
+            if key is not None:
+                self._waiting_by_key[key] = operation
+            self._condition.notify_all()
+
+    def flush(self):
+        """
+        Waits until all submitted operations have been executed.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: not self._operations and not self._busy)
+
+    def pop_errors(self):
+        """
+        Returns: list(tuple(str, Exception)): description and error of the operations that failed since the previous
+            call
+        """
+        with self._condition:
+            errors, self._errors = self._errors, []
+        return errors
+
+    def _work(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._operations)
+                operation = self._operations.popleft()
+                if self._waiting_by_key.get(operation.key) is operation:
+                    del self._waiting_by_key[operation.key]
+                self._busy = True
+
+            try:
+                response = operation.run(operation.body)
+                for on_success in operation.on_success:
+                    on_success(response)
+            except Exception as error:
+                with self._condition:
+                    self._errors.append((operation.description, error))
+                for on_error in reversed(operation.on_error):
+                    on_error(error)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
@@ -8,11 +8,16 @@ setuptools.setup(
     url="https://github.com/spmvg/productivity",
     packages=setuptools.find_packages(include=['productivity']),
     install_requires=[
-        'google-api-python-client',
-        'google-auth-httplib2',
+        'google-api-python-client>=2.0',  # bundles the discovery documents
         'google-auth-oauthlib',
+        'httplib2',  # the transport returns httplib2 responses
+        'numpy',
         'parameterized',
-        'pytz'
+        'pytz',
+        'requests'
     ],
+    extras_require={
+        'benchmarks': ['pytest-benchmark']
+    },
     python_requires='>=3.7'
 )
\ No newline at end of file
@@ -0,0 +1,480 @@
+import contextlib
+import datetime
+import email.parser
+import hashlib
+import http.client
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from unittest import mock
+
+import httplib2
+
+from productivity.config import TASK_LISTS
+from productivity.google_api import GoogleAPI
+
+_MAXIMUM_TASKS_PAGE_SIZE = 100
+_DEFAULT_TASKS_PAGE_SIZE = 20
+_MAXIMUM_EVENTS_PAGE_SIZE = 2500
+_DEFAULT_EVENTS_PAGE_SIZE = 250
+
+
+@contextlib.contextmanager
+def fake_google_environment(fake=None):
+    """
+    Within the context, services that are made send their requests to a fake instead of Google, the local stores are
+    kept in memory, calls are not rate limited and lists are not prefetched in the background. The task lists of the
+    configuration are made in the fake, except the lists of other accounts.
+
+    Args:
+        fake (FakeGoogle, optional): the fake to use. Defaults to a new fake.
+
+    Returns: context manager that gives the fake
+    """
+    fake = fake or FakeGoogle()
+    for list_name, list_ids in TASK_LISTS.items():
+        for list_id in list_ids:
+            if isinstance(list_id, str) and list_id not in fake.task_lists:
+                fake.add_task_list(list_id, list_name)
+    GoogleAPI.use_transport(fake)
+    try:
+        with mock.patch('productivity.google_api.RATE_LIMITS', {}), \
+                mock.patch.object(GoogleAPI, '_shared_rate_limiters', {}), \
+                mock.patch.object(GoogleAPI, '_shared_response_store', None), \
+                mock.patch('productivity.google_api.RESPONSE_STORE_FILE', ':memory:'), \
+                mock.patch('productivity.inbox_google.TASK_STORE_FILE', ':memory:'), \
+                mock.patch('productivity.calendar_google.EVENT_STORE_FILE', ':memory:'), \
+                mock.patch('productivity.inbox_google.PREFETCH_INTERVAL_SECONDS', None):
+            yield fake
+    finally:
+        GoogleAPI.use_transport(None)
+
+
+def apply_fields(value, fields):
+    """
+    Returns: the parts of a response that are selected by a partial response mask, like 'nextPageToken,items(id,title)'
+    """
+    return _select(value, _parse_fields(fields))
+
+
+def _parse_fields(fields):
+    """
+    Returns: dict: the selected fields by name, with the selected subfields or None if the whole field is selected
+    """
+    stack = [{}]
+    name = ''
+    for character in fields + ',':
+        if character in ',()':
+            if name:
+                path = name.strip().split('/')
+                selection = stack[-1]
+                for part in path[:-1]:
+                    selection = selection.setdefault(part, {})
+                selection[path[-1]] = {} if character == '(' else selection.get(path[-1])
+                if character == '(':
+                    stack.append(selection[path[-1]])
+            if character == ')':
+                stack.pop()
+            name = ''
+        else:
+            name += character
+    return stack[0]
+
+
+def _select(value, selection):
+    if not selection:
+        return value
+    if isinstance(value, list):
+        return [_select(item, selection) for item in value]
+    if isinstance(value, dict):
+        return {key: _select(value[key], subselection) for key, subselection in selection.items() if key in value}
+    return value
+
+
+class FakeGoogle:
+    """
+    In-process stand-in for the endpoints of Google Tasks v1 and Google Calendar v3 that are used by productivity:
+    listing with pagination, insert, patch, batch requests and the sync token of Calendar. Like
+    `googleapiclient.http.HttpMock`, it is an httplib2-compatible transport:
+
+        fake = FakeGoogle()
+        GoogleAPI.use_transport(fake)
+        inbox = Inbox()
+
+    The fake can add latency to every HTTP request and fail calls, and counts the HTTP requests and the calls, so
+    that the cost of commands can be measured without the network.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        """
+        Args:
+            latency (float, optional): seconds that every HTTP request takes. A batch request takes this time once.
+            error_rate (float, optional): fraction of the calls that fail with a temporary error (503)
+            seed (int, optional): seed of the random failures
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._ids = itertools.count(1)
+        self._changes = itertools.count(1)  # a sync token is the number of the last change that it includes
+        self._oldest_sync_token = 0
+        self._failures = []  # status, HTTP method and Retry-After of the next calls that fail
+        self._batch_failures = []  # status of the next batch requests, None for a batch request that does not fail
+
+        self.task_lists = {}  # list ID -> {'title': str, 'tasks': dict(str, dict), 'updated': str}
+        self.events = {}  # event ID -> event, of the primary calendar
+        self._event_metadata = {}  # event ID -> number of the last change, start and end
+        self.busy_times = {}  # calendar ID -> list of busy start and end, of the calendars other than the primary
+
+        self.http_requests = 0  # number of HTTP requests, a batch request counts once
+        self.calls = []  # method and path of every call, including the calls in batch requests
+        self.bytes_received = 0  # request bodies
+        self.bytes_sent = 0  # response bodies
+        self.not_modified = 0  # number of calls with the response 304 Not Modified
+        self.max_concurrent_requests = 0  # highest number of HTTP requests that were in progress at the same time
+        self._requests_in_progress = 0
+
+    def add_task_list(self, list_id, title=None):
+        with self._lock:
+            self.task_lists[list_id] = {'title': title or list_id, 'tasks': {}, 'updated': self._now()}
+
+    def add_task(self, list_id, title, status='needsAction'):
+        """
+        Returns: str: the ID of the new task
+        """
+        with self._lock:
+            return self._insert_task(list_id, {'title': title, 'status': status})[1]['id']
+
+    def add_event(self, summary, start, end=None):
+        """
+        Args:
+            summary (str): the title of the event
+            start (datetime.date or datetime.datetime): the date of an all-day event, or the start in UTC
+            end (datetime.datetime, optional): the end in UTC, for events that are not all-day
+
+        Returns: str: the ID of the new event
+        """
+        if end is None:
+            times = {'start': {'date': start.isoformat()}, 'end': {'date': start.isoformat()}}
+        else:
+            times = {'start': {'dateTime': self._format_datetime(start)},
+                     'end': {'dateTime': self._format_datetime(end)}}
+        with self._lock:
+            return self._insert_event('primary', dict(summary=summary, **times))[1]['id']
+
+    def add_busy_time(self, calendar_id, start, end):
+        """
+        Makes a calendar other than the primary calendar busy from start until end, both in UTC.
+        """
+        with self._lock:
+            self.busy_times.setdefault(calendar_id, []).append((start.replace(tzinfo=datetime.timezone.utc), end.replace(tzinfo=datetime.timezone.utc)))
+
+    def fail_next(self, status, count=1, method=None, retry_after=None):
+        """
+        Makes the next calls fail with an HTTP status, like 403 for a rate limit or 500 for a server error.
+
+        Args:
+            status (int): the HTTP status of the failures
+            count (int, optional): the number of calls that fail
+            method (str, optional): if given, only calls with this HTTP method fail, like 'POST' for inserts
+            retry_after (int, optional): if given, the failures have a Retry-After header with this number of seconds
+        """
+        with self._lock:
+            self._failures.extend([(status, method, retry_after)] * count)
+
+    def fail_next_batches(self, statuses):
+        """
+        Makes whole batch requests fail, instead of the calls in them.
+
+        Args:
+            statuses (list(int)): the HTTP status of the next batch requests, or None for a batch request that is
+                executed normally, like [None, 400] to make the second batch request fail
+        """
+        with self._lock:
+            self._batch_failures.extend(statuses)
+
+    def expire_sync_tokens(self):
+        """
+        Makes Google Calendar respond with 410 Gone to the sync tokens that were returned so far.
+        """
+        with self._lock:
+            self._oldest_sync_token = next(self._changes)
+
+    def reset_counters(self):
+        with self._lock:
+            self.http_requests = 0
+            self.calls = []
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.not_modified = 0
+            self.max_concurrent_requests = 0
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        """
+        Same as `httplib2.Http.request`.
+        """
+        with self._lock:
+            self._requests_in_progress += 1
+            self.max_concurrent_requests = max(self.max_concurrent_requests, self._requests_in_progress)
+        try:
+            return self._request(uri, method, body, headers)
+        finally:
+            with self._lock:
+                self._requests_in_progress -= 1
+
+    def _request(self, uri, method, body, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+
+        path = urllib.parse.urlsplit(uri).path
+        with self._lock:
+            self.http_requests += 1
+            self.bytes_received += len(body or b'')
+        with self._lock:
+            batch_status = self._batch_failures.pop(0) if self._batch_failures and path.startswith('/batch') else None
+        if batch_status is not None:
+            status, response = self._error(batch_status)
+            content_type, content = 'application/json', json.dumps(response).encode('utf-8')
+            response_headers = {}
+        elif path == '/batch' or path.startswith('/batch/'):
+            status, content_type, content = self._batch(body, headers['content-type'])
+            response_headers = {}
+        else:
+            status, response, response_headers = self._call(method, uri, body, headers.get('if-none-match'))
+            content_type, content = 'application/json', b'' if status == 304 else json.dumps(response).encode('utf-8')
+
+        with self._lock:
+            self.bytes_sent += len(content)
+        response_headers.update({'status': str(status), 'content-type': content_type})
+        return httplib2.Response(response_headers), content
+
+    def _batch(self, body, content_type):
+        message = email.parser.BytesParser().parsebytes(b'content-type: ' + content_type.encode('ascii') + b'\r\n\r\n'
+                                                        + body)
+        boundary = 'fake_google_batch_boundary'
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            method, uri, _ = request_line.strip().split(' ')
+            call_body = re.split(r'\r?\n\r?\n', rest, maxsplit=1)[1] if re.search(r'\r?\n\r?\n', rest) else ''
+            status, response, response_headers = self._call(method, uri, call_body.encode('utf-8') or None)
+            content_id = part['Content-ID'].strip('<>')
+            header_lines = ''.join('{}: {}\r\n'.format(key, value) for key, value in response_headers.items())
+            parts.append('--{}\r\nContent-Type: application/http\r\nContent-ID: <response-{}>\r\n\r\n'
+                         'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\n{}\r\n{}\r\n'
+                         .format(boundary, content_id, status, http.client.responses[status], header_lines,
+                                 json.dumps(response)))
+        content = ''.join(parts) + '--{}--'.format(boundary)
+        return 200, 'multipart/mixed; boundary={}'.format(boundary), content.encode('utf-8')
+
+    def _call(self, method, uri, body, if_none_match=None):
+        """
+        Args:
+            if_none_match (str, optional): the ETag of the response that the caller has, for conditional GET requests
+
+        Returns: tuple(int, dict, dict): the status, body and headers of the response to a call
+        """
+        split_uri = urllib.parse.urlsplit(uri)
+        path = split_uri.path
+        query = dict(urllib.parse.parse_qsl(split_uri.query))
+        body = json.loads(body) if body else {}
+
+        with self._lock:
+            self.calls.append((method, path))
+            for index, (status, failing_method, retry_after) in enumerate(self._failures):
+                if failing_method in (None, method):
+                    del self._failures[index]
+                    return self._error(status) + ({'retry-after': str(retry_after)} if retry_after else {},)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self._error(503) + ({},)
+
+            for route_method, pattern, handler in self._routes():
+                match = re.match(pattern, path)
+                if match and method == route_method:
+                    arguments = [urllib.parse.unquote(group) for group in match.groups()]
+                    status, response = handler(*arguments, query) if method == 'GET' else handler(*arguments, body)
+                    if status == 200 and if_none_match and response.get('etag') == if_none_match:
+                        self.not_modified += 1
+                        return 304, None, {}
+                    if status == 200 and 'fields' in query:
+                        response = apply_fields(response, query['fields'])
+                    return status, response, {}
+        return self._error(404) + ({},)
+
+    def _routes(self):
+        return [
+            ('GET', r'^/tasks/v1/users/@me/lists$', self._list_task_lists),
+            ('GET', r'^/tasks/v1/lists/([^/]+)/tasks$', self._list_tasks),
+            ('POST', r'^/tasks/v1/lists/([^/]+)/tasks$', self._insert_task),
+            ('PATCH', r'^/tasks/v1/lists/([^/]+)/tasks/([^/]+)$', self._patch_task),
+            ('GET', r'^/calendar/v3/calendars/([^/]+)/events$', self._list_events),
+            ('POST', r'^/calendar/v3/calendars/([^/]+)/events$', self._insert_event),
+            ('PATCH', r'^/calendar/v3/calendars/([^/]+)/events/([^/]+)$', self._patch_event),
+            ('POST', r'^/calendar/v3/freeBusy$', self._query_free_busy),
+        ]
+
+    @staticmethod
+    def _error(status):
+        reason = {403: 'rateLimitExceeded', 404: 'notFound', 410: 'fullSyncRequired'}.get(status, 'backendError')
+        return status, {'error': {'code': status, 'message': http.client.responses[status],
+                                  'errors': [{'reason': reason, 'message': http.client.responses[status]}]}}
+
+    @staticmethod
+    def _page(items, query, default_size, maximum_size):
+        """
+        Returns: tuple(list, dict): the items of the requested page and the page token of the next page, if any
+        """
+        start = int(query.get('pageToken', 0))
+        end = start + min(int(query.get('maxResults', default_size)), maximum_size)
+        return items[start:end], ({'nextPageToken': str(end)} if end < len(items) else {})
+
+    @staticmethod
+    def _etag(value):
+        return '"{}"'.format(hashlib.md5(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    @staticmethod
+    def _format_datetime(value):
+        return value.strftime('%Y-%m-%dT%H:%M:%S') + '+00:00'
+
+    @staticmethod
+    def _parse_datetime(value):
+        return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(datetime.timezone.utc)
+
+    # Google Tasks
+
+    def _list_task_lists(self, query):
+        items = [{'kind': 'tasks#taskList', 'id': list_id, 'etag': self._etag(list_id), 'title': task_list['title'],
+                  'updated': task_list['updated'],
+                  'selfLink': 'https://www.googleapis.com/tasks/v1/users/@me/lists/' + list_id}
+                 for list_id, task_list in self.task_lists.items()]
+        page, next_page = self._page(items, query, _DEFAULT_TASKS_PAGE_SIZE, _MAXIMUM_TASKS_PAGE_SIZE)
+        return 200, dict(kind='tasks#taskLists', etag=self._etag(items), items=page, **next_page)
+
+    def _list_tasks(self, list_id, query):
+        if list_id not in self.task_lists:
+            return self._error(404)
+        show_completed = query.get('showCompleted', 'true') == 'true'
+        show_deleted = query.get('showDeleted', 'false') == 'true'
+        show_hidden = query.get('showHidden', 'false') == 'true'
+        updated_min = self._parse_datetime(query['updatedMin']) if 'updatedMin' in query else None
+        items = [dict(task) for task in self.task_lists[list_id]['tasks'].values()
+                 if (show_completed or task['status'] != 'completed')
+                 and (show_deleted or not task.get('deleted'))
+                 and (show_hidden or not task.get('hidden'))
+                 and (updated_min is None or self._parse_datetime(task['updated']) >= updated_min)]
+        items.sort(key=lambda task: task['position'])
+        page, next_page = self._page(items, query, _DEFAULT_TASKS_PAGE_SIZE, _MAXIMUM_TASKS_PAGE_SIZE)
+        return 200, dict(kind='tasks#tasks', etag=self._etag(page), items=page, **next_page)
+
+    def _insert_task(self, list_id, body):
+        if list_id not in self.task_lists:
+            return self._error(404)
+        task_id = 'task{}'.format(next(self._ids))
+        task = dict(body, kind='tasks#task', id=task_id, status=body.get('status', 'needsAction'),
+                    position='{:020d}'.format(next(self._changes)), updated=self._now(), links=[],
+                    selfLink='https://www.googleapis.com/tasks/v1/lists/{}/tasks/{}'.format(list_id, task_id),
+                    webViewLink='https://tasks.google.com/task/{}'.format(task_id))
+        task['etag'] = self._etag(task)
+        self.task_lists[list_id]['tasks'][task_id] = task
+        return 200, dict(task)
+
+    def _patch_task(self, list_id, task_id, body):
+        task = self.task_lists.get(list_id, {}).get('tasks', {}).get(task_id)
+        if task is None:
+            return self._error(404)
+        task.update(body, updated=self._now())
+        task['etag'] = self._etag(task)
+        return 200, dict(task)
+
+    # Google Calendar
+
+    def _list_events(self, calendar_id, query):
+        if calendar_id != 'primary':
+            return self._error(404)
+        if 'syncToken' in query:
+            sync_token = int(query['syncToken'])
+            if sync_token < self._oldest_sync_token:
+                return self._error(410)
+            event_ids = [event_id for event_id, (change, _, _) in self._event_metadata.items() if change > sync_token]
+        else:
+            time_min = self._parse_datetime(query['timeMin']) if 'timeMin' in query else None
+            time_max = self._parse_datetime(query['timeMax']) if 'timeMax' in query else None
+            event_ids = [event_id for event_id, (_, start, end) in self._event_metadata.items()
+                         if self.events[event_id]['status'] != 'cancelled'
+                         and (time_min is None or end > time_min) and (time_max is None or start < time_max)]
+
+        page, next_page = self._page(event_ids, query, _DEFAULT_EVENTS_PAGE_SIZE, _MAXIMUM_EVENTS_PAGE_SIZE)
+        if not next_page:
+            last_change = max((change for change, _, _ in self._event_metadata.values()), default=0)
+            next_page = {'nextSyncToken': str(last_change)}
+        items = [dict(self.events[event_id]) for event_id in page]
+        return 200, dict(kind='calendar#events', etag=self._etag(items), summary='me@example.com',
+                         updated=self._now(), timeZone='Europe/Amsterdam', accessRole='owner',
+                         defaultReminders=[{'method': 'popup', 'minutes': 30}], items=items, **next_page)
+
+    def _store_event(self, event):
+        """
+        Normalizes the times of an event like Google Calendar does, and remembers the change and the bounds of the
+        event for listing.
+        """
+        bounds = []
+        for key in ('start', 'end'):
+            time = event[key]
+            if 'date' in time:
+                bounds.append(datetime.datetime.fromisoformat(time['date']).replace(tzinfo=datetime.timezone.utc))
+            else:
+                bounds.append(self._parse_datetime(time['dateTime']))
+                event[key] = {'dateTime': self._format_datetime(bounds[-1])}
+        event['updated'] = self._now()
+        event['etag'] = self._etag(event)
+        self.events[event['id']] = event
+        self._event_metadata[event['id']] = (next(self._changes), bounds[0], bounds[1])
+        return 200, dict(event)
+
+    def _insert_event(self, calendar_id, body):
+        if calendar_id != 'primary':
+            return self._error(404)
+        event_id = 'event{}'.format(next(self._ids))
+        person = {'email': 'me@example.com', 'self': True}
+        return self._store_event(dict(body, kind='calendar#event', id=event_id, status='confirmed',
+                                      htmlLink='https://www.google.com/calendar/event?eid=' + event_id,
+                                      created=self._now(), creator=person, organizer=person,
+                                      iCalUID=event_id + '@google.com', sequence=0, reminders={'useDefault': True},
+                                      eventType='default'))
+
+    def _patch_event(self, calendar_id, event_id, body):
+        event = self.events.get(event_id) if calendar_id == 'primary' else None
+        if event is None:
+            return self._error(404)
+        return self._store_event(dict(event, **body))
+
+    def _query_free_busy(self, body):
+        time_min, time_max = self._parse_datetime(body['timeMin']), self._parse_datetime(body['timeMax'])
+        calendars = {}
+        for item in body.get('items', []):
+            if item['id'] == 'primary':
+                busy_times = [(start, end) for event_id, (_, start, end) in self._event_metadata.items()
+                              if self.events[event_id]['status'] != 'cancelled'
+                              and self.events[event_id].get('transparency') != 'transparent']
+            elif item['id'] in self.busy_times:
+                busy_times = self.busy_times[item['id']]
+            else:
+                calendars[item['id']] = {'busy': [], 'errors': [{'domain': 'global', 'reason': 'notFound'}]}
+                continue
+            calendars[item['id']] = {'busy': [
+                {'start': self._format_datetime(max(start, time_min)), 'end': self._format_datetime(min(end, time_max))}
+                for start, end in sorted(busy_times) if start < time_max and end > time_min]}
+        return 200, {'kind': 'calendar#freeBusy', 'timeMin': body['timeMin'], 'timeMax': body['timeMax'],
+                     'calendars': calendars}
@@ -0,0 +1,55 @@
+import datetime
+from parameterized import parameterized
+import pytz
+from productivity.availability import Availability
+from productivity.datetime_interval import DatetimeInterval
+import unittest
+
+MONDAY = datetime.date(2021, 3, 22)
+DST_START_SUNDAY = datetime.date(2021, 3, 28)  # Europe/Amsterdam moves from 02:00 to 03:00
+DST_END_SUNDAY = datetime.date(2021, 10, 31)  # Europe/Amsterdam moves from 03:00 to 02:00
+
+
+def _utc(*args):
+    return pytz.UTC.localize(datetime.datetime(*args))
+
+
+class TestAvailability(unittest.TestCase):
+    @parameterized.expand([('unknown_weekday', {'monday': [('0900', '1000')]}),
+                           ('bad_format', {'mon': [('9:00', '1000')]}),
+                           ('bad_minutes', {'mon': [('0960', '1000')]}),
+                           ('bad_hours', {'mon': [('0900', '2500')]}),
+                           ('start_after_end', {'mon': [('1000', '0900')]}),
+                           ('overlap', {'mon': [('0900', '1100'), ('1000', '1200')]})])
+    def test_init_value_error(self, _, times_per_weekday):
+        with self.assertRaises(ValueError):
+            Availability(times_per_weekday, 'Europe/Amsterdam')
+
+    def test_intervals(self):
+        availability = Availability({'mon': [('1300', '1400'), ('0900', '1000')], 'wed': [('0000', '2400')]},
+                                    'Europe/Amsterdam')
+        self.assertEqual([DatetimeInterval(_utc(2021, 3, 22, 8), _utc(2021, 3, 22, 9)),
+                          DatetimeInterval(_utc(2021, 3, 22, 12), _utc(2021, 3, 22, 13)),
+                          DatetimeInterval(_utc(2021, 3, 23, 23), _utc(2021, 3, 24, 23)),
+                          DatetimeInterval(_utc(2021, 3, 29, 7), _utc(2021, 3, 29, 8)),  # daylight saving time
+                          DatetimeInterval(_utc(2021, 3, 29, 11), _utc(2021, 3, 29, 12))],
+                         availability.intervals(MONDAY, 8).to_intervals())
+
+    def test_intervals_on_start_of_daylight_saving_time(self):
+        availability = Availability({'sun': [('0100', '0230'), ('1200', '2400')]}, 'Europe/Amsterdam')
+        self.assertEqual([DatetimeInterval(_utc(2021, 3, 28, 0), _utc(2021, 3, 28, 1, 30)),  # 02:30 becomes 03:30
+                          DatetimeInterval(_utc(2021, 3, 28, 10), _utc(2021, 3, 28, 22))],
+                         availability.intervals(DST_START_SUNDAY, 1).to_intervals())
+
+    def test_intervals_on_end_of_daylight_saving_time(self):
+        availability = Availability({'sun': [('0000', '0100'), ('1200', '1300')]}, 'Europe/Amsterdam')
+        self.assertEqual([DatetimeInterval(_utc(2021, 10, 30, 22), _utc(2021, 10, 30, 23)),
+                          DatetimeInterval(_utc(2021, 10, 31, 11), _utc(2021, 10, 31, 12))],
+                         availability.intervals(DST_END_SUNDAY, 1).to_intervals())
+
+    def test_no_intervals(self):
+        self.assertFalse(Availability({}, 'Europe/Amsterdam').intervals(MONDAY, 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import datetime
+import pytz
+from productivity.availability import Availability
+from productivity.console import Console
+from productivity.datetime_interval import DatetimeInterval
+from productivity.interval_set import IntervalSet
+from productivity.task import Task
+import unittest
+from unittest import mock
+
+TIMES = [pytz.UTC.localize(datetime.datetime(2000, 1, 1, 9, minute)) for minute in range(0, 60, 5)]
+
+
+def _console(task_titles):
+    console = Console.__new__(Console)
+    console._inbox = mock.Mock()
+    console._inbox.get_tasks.return_value = [Task(str(index), title) for index, title in enumerate(task_titles)]
+    return console
+
+
+class TestConsole(unittest.TestCase):
+    def test_schedule_in_whitespace_longest_tasks_first(self):
+        console = _console(['Short task #5min', 'Long task #15min'])
+        whitespaces = IntervalSet.from_intervals([DatetimeInterval(TIMES[0], TIMES[1]),
+                                                  DatetimeInterval(TIMES[2], TIMES[6])])
+        self.assertEqual([('Long task #15min', TIMES[2], TIMES[5]),
+                          ('Short task #5min', TIMES[0], TIMES[1])],
+                         console._schedule_in_whitespace(whitespaces))
+
+    def test_schedule_in_whitespace_skips_tasks_that_do_not_fit(self):
+        console = _console(['Task that does not fit #30min', 'Task #5min', 'Another task #5min'])
+        whitespaces = IntervalSet.from_intervals([DatetimeInterval(TIMES[0], TIMES[1]),
+                                                  DatetimeInterval(TIMES[3], TIMES[4])])
+        self.assertEqual([('Task #5min', TIMES[0], TIMES[1]),
+                          ('Another task #5min', TIMES[3], TIMES[4])],
+                         console._schedule_in_whitespace(whitespaces))
+
+    def test_schedule_in_whitespace_skips_tasks_of_zero_minutes(self):
+        console = _console(['Task #0min', 'Task #5min'])
+        self.assertEqual([('Task #5min', TIMES[0], TIMES[1])], console._schedule_in_whitespace(
+            IntervalSet.from_intervals([DatetimeInterval(TIMES[0], TIMES[1])])))
+        self.assertEqual([], console._schedule_in_whitespace(IntervalSet.from_intervals([])))
+
+    def test_desired_intervals_from_config_discards_the_past(self):
+        console = _console([])
+        console._availability = Availability({'mon': [('0000', '2400')]}, 'UTC')
+        now = datetime.datetime.now(tz=pytz.UTC)
+        today = datetime.datetime(now.year, now.month, now.day)
+        intervals = console._desired_intervals_from_config(today, 7, pytz.UTC.localize(today)
+                                                           + datetime.timedelta(days=7)).to_intervals()
+        self.assertEqual(1, len(intervals))
+        self.assertEqual(0, intervals[0].start.weekday())
+        self.assertGreaterEqual(intervals[0].start, now)
+
+if __name__ == '__main__':
+    unittest.main()
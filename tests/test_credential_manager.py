@@ -0,0 +1,84 @@
+import datetime
+import json
+import os
+import pickle
+import tempfile
+import threading
+from google.oauth2.credentials import Credentials
+from productivity.credential_manager import CredentialManager
+import unittest
+from unittest import mock
+
+
+def _credentials(token='token', expires_in=datetime.timedelta(hours=1)):
+    return Credentials(token, refresh_token='refresh_token', client_id='client_id', client_secret='client_secret',
+                       token_uri='https://oauth2.googleapis.com/token',
+                       expiry=datetime.datetime.utcnow() + expires_in)
+
+
+class TestCredentialManager(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.token_file = os.path.join(self.directory, 'token.json')
+        self.pickle_token_file = os.path.join(self.directory, 'token.pickle')
+
+        self.refreshed = threading.Event()
+        self.refresh_threads = []
+
+        def refresh(credentials, request):
+            self.refresh_threads.append(threading.current_thread())
+            credentials.token = 'refreshed'
+            credentials.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+            self.refreshed.set()
+        patcher = mock.patch.object(Credentials, 'refresh', autospec=True, side_effect=refresh)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _manager(self):
+        return CredentialManager(self.token_file, 'credentials.json', ['scope'],
+                                 pickle_token_file=self.pickle_token_file)
+
+    def _saved_token(self):
+        with open(self.token_file) as f:
+            return json.load(f)['token']
+
+    def test_pickle_token_is_converted_to_json(self):
+        with open(self.pickle_token_file, 'wb') as f:
+            pickle.dump(_credentials(), f)
+        self.assertEqual('token', self._manager().credentials.token)
+        self.assertFalse(os.path.exists(self.pickle_token_file))
+        self.assertEqual('token', self._saved_token())
+        self.assertEqual('token', self._manager().credentials.token)
+
+    def test_expired_token_is_refreshed_in_background_after_loading(self):
+        with open(self.token_file, 'w') as f:
+            f.write(_credentials(expires_in=datetime.timedelta(hours=-1)).to_json())
+        manager = self._manager()
+
+        self.assertTrue(self.refreshed.wait(5))
+        with manager._lock:  # waits until the token is saved
+            pass
+        self.assertEqual('refreshed', manager.credentials.token)
+        self.assertEqual('refreshed', self._saved_token())
+        self.assertNotIn(threading.main_thread(), self.refresh_threads)
+
+    def test_token_is_refreshed_in_background_before_it_expires(self):
+        with open(self.token_file, 'w') as f:
+            f.write(_credentials(expires_in=CredentialManager._REFRESH_MARGIN + datetime.timedelta(seconds=0.1))
+                    .to_json())
+        manager = self._manager()
+        self.assertEqual('token', manager.credentials.token)
+        self.assertTrue(manager.credentials.valid)
+
+        self.assertTrue(self.refreshed.wait(5))
+        with manager._lock:  # waits until the token is saved
+            pass
+        self.assertEqual('refreshed', manager.credentials.token)
+        self.assertEqual('refreshed', self._saved_token())
+        self.assertEqual(['token.json'], os.listdir(self.directory))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,423 @@
+import datetime
+import io
+import threading
+from fake_google import FakeGoogle, fake_google_environment
+from googleapiclient.errors import HttpError
+from parameterized import parameterized
+import pytz
+from productivity.calendar_google import Calendar
+from productivity.config import GOOGLE_TASKS_INBOX_ID
+from productivity.console import Console
+from productivity.google_api import GoogleAPI
+from productivity.inbox_google import Inbox
+from productivity.metrics import metrics
+from productivity.task_list import TaskList
+import unittest
+from unittest import mock
+
+
+class TestEndToEnd(unittest.TestCase):
+    def setUp(self):
+        self.fake = FakeGoogle()
+        environment = fake_google_environment(self.fake)
+        environment.__enter__()
+        self.addCleanup(environment.__exit__, None, None, None)
+        retry_without_waiting = mock.patch.object(GoogleAPI, '_RETRY_SECONDS', 0)
+        retry_without_waiting.start()
+        self.addCleanup(retry_without_waiting.stop)
+
+    def _console(self):
+        with mock.patch('sys.stdout', io.StringIO()):
+            return Console()
+
+    def _run(self, console, query):
+        with mock.patch('sys.stdout', io.StringIO()) as output:
+            console._call_matching_handler(query)
+        return output.getvalue()
+
+    def _unfinished_titles(self, list_id=GOOGLE_TASKS_INBOX_ID, fake=None):
+        return sorted(task['title'] for task in (fake or self.fake).task_lists[list_id]['tasks'].values()
+                      if task['status'] == 'needsAction')
+
+    def test_triage_completes_skips_and_edits_tasks(self):
+        for index in range(250):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+
+        self.assertEqual(250, len(inbox.get_tasks()))
+        # the tasks are listed in pages of 100
+        self.assertEqual(3, self.fake.http_requests)
+        for _ in range(100):
+            inbox.get_task()
+            inbox.complete_task()
+        inbox.get_task()
+        inbox.skip_task()
+        inbox.get_task()
+        inbox.edit_task('Edited task')
+        inbox.wait_for_writes()
+
+        self.assertEqual([], inbox.pop_write_errors())
+        self.assertEqual(150, len(self._unfinished_titles()))
+        self.assertIn('Edited task', self._unfinished_titles())
+        self.assertEqual(150, len(inbox.get_tasks(force_reload=True)))
+        # every change is one call
+        self.assertEqual(101, sum(method == 'PATCH' for method, _ in self.fake.calls))
+
+    def test_reloading_unchanged_list_reuses_tasks(self):
+        for index in range(3):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        for task in self.fake.task_lists[GOOGLE_TASKS_INBOX_ID]['tasks'].values():
+            task['updated'] = '2000-01-01T00:00:00.000Z'  # changed long before the synchronization
+        inbox = Inbox()
+        tasks = inbox.get_tasks()
+
+        self.assertEqual([id(task) for task in tasks], [id(task) for task in inbox.get_tasks(force_reload=True)])
+        with mock.patch.object(inbox._task_store, 'upsert') as upsert:
+            for _ in range(2):
+                self.assertEqual([id(task) for task in tasks],
+                                 [id(task) for task in inbox.get_tasks(force_reload=True)])
+        # the first reload stores the empty page of changes, Google does not send it again to the next reloads
+        self.assertEqual(2, self.fake.not_modified)
+        upsert.assert_not_called()  # the pages that Google did not send again are not applied again
+
+        self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'New task')
+        self.assertEqual(['Task 0', 'Task 1', 'Task 2', 'New task'],
+                         [task.title for task in inbox.get_tasks(force_reload=True)])
+
+    def test_etag_of_a_page_is_not_sent_for_the_next_page(self):
+        for index in range(150):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+        inbox.get_tasks()
+        query = dict(tasklist=GOOGLE_TASKS_INBOX_ID, maxResults=Inbox._PAGE_SIZE)
+        inbox._execute(inbox._request('tasks', 'list', Inbox._TASK_PAGE_FIELDS, **query))  # stores the first page
+
+        with mock.patch.object(self.fake, 'request', wraps=self.fake.request) as request:
+            self.assertEqual(2, len(list(inbox._paginate_responses('tasks', Inbox._TASK_PAGE_FIELDS, **query))))
+        self.assertEqual([True, False], [{key.lower() for key in call.kwargs['headers']} >= {'if-none-match'}
+                                         for call in request.call_args_list])
+
+    def test_failed_sync_downloads_all_tasks_again(self):
+        for index in range(3):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+        inbox.get_tasks()
+        self.fake.fail_next(400, method='GET')
+        with self.assertRaises(HttpError):
+            inbox.get_tasks(force_reload=True)
+        # pages may have been stored without being applied, so they are not skipped when Google does not send them
+        self.assertIsNone(inbox._task_store.updated_min(GOOGLE_TASKS_INBOX_ID))
+        self.assertEqual(['Task 0', 'Task 1', 'Task 2'], [task.title for task in inbox.get_tasks(force_reload=True)])
+
+    def test_tasks_changed_while_changes_are_downloaded_are_not_overwritten(self):
+        for index in range(3):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+        inbox.get_tasks()
+        download = inbox._paginate_responses
+
+        def download_then_change_tasks(*args, **kwargs):
+            responses = list(download(*args, **kwargs))
+            inbox.get_task()
+            inbox.complete_task()
+            inbox.get_task()
+            inbox.edit_task('Edited task')
+            return responses
+        with mock.patch.object(inbox, '_paginate_responses', side_effect=download_then_change_tasks):
+            self.assertEqual(['Edited task', 'Task 2'], [task.title for task in inbox.get_tasks(force_reload=True)])
+        inbox.wait_for_writes()
+        self.assertEqual(['Edited task', 'Task 2'], [task.title for task in inbox.get_tasks(force_reload=True)])
+
+    def test_tasks_are_restored_when_google_tasks_cannot_change_them(self):
+        for index in range(3):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+        inbox.get_tasks()
+        self.fake.fail_next(500, 20, method='PATCH')
+        inbox.get_task()
+        inbox.complete_task()
+        inbox.get_task()
+        inbox.edit_task('Edited task')
+        inbox.wait_for_writes()
+
+        self.assertEqual(['complete task "Task 0"', 'edit task "Edited task"'],
+                         [description for description, _ in inbox.pop_write_errors()])
+        self.assertEqual(['Task 0', 'Task 1', 'Task 2'], [task.title for task in inbox.get_tasks()])
+        self.assertEqual(['Task 0', 'Task 1', 'Task 2'], [task.title for task in inbox.get_tasks(force_reload=True)])
+
+    @parameterized.expand([('c', 'schedule event "Task 0"'), ('w', 'new task "Task 0"')])
+    def test_task_is_not_completed_when_it_cannot_be_moved(self, query, description):
+        for index in range(2):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        console = self._console()
+        console._inbox.get_task()
+        self.fake.fail_next(400, method='POST')
+        self._run(console, query)
+        console._inbox.wait_for_writes()
+
+        self.assertEqual([description], [description for description, _ in console._inbox.pop_write_errors()])
+        self.assertEqual(['Task 0', 'Task 1'], self._unfinished_titles())
+        self.assertEqual(['Task 0', 'Task 1'], [task.title for task in console._inbox.get_tasks()])
+        self.assertEqual(0, sum(method == 'PATCH' for method, _ in self.fake.calls))
+
+    def test_tasks_are_not_renamed_while_they_are_read(self):
+        for index in range(3):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {}'.format(index))
+        inbox = Inbox()
+        tasks = inbox._get_task_lists()[0]
+        iterate = TaskList.__iter__
+        renamers = []
+
+        def rename(task_id):  # like the background thread, when Google Tasks has made a new task
+            with inbox._tasks_lock:
+                tasks.rename(task_id, 'renamed')
+
+        def iterate_while_renaming(task_list):
+            for task in iterate(task_list):
+                if not renamers:
+                    renamers.append(threading.Thread(target=rename, args=(task.ID,)))
+                    renamers[0].start()
+                    renamers[0].join(0.1)
+                yield task
+        with mock.patch.object(TaskList, '__iter__', iterate_while_renaming):
+            self.assertEqual(['Task 0', 'Task 1', 'Task 2'], [task.title for task in inbox.get_tasks()])
+        renamers[0].join()
+        self.assertEqual(['Task 1', 'Task 2', 'Task 0'], [task.title for task in inbox.get_tasks()])
+
+    def test_new_task_is_made_once_when_it_is_edited_before_it_is_sent(self):
+        inbox = Inbox()
+        inbox.get_tasks()
+        with mock.patch.object(self.fake, 'latency', 0.05):
+            inbox.new_task('New task')
+            inbox.get_task()
+            inbox.edit_task('Edited new task')
+        inbox.wait_for_writes()
+
+        self.assertEqual(['Edited new task'], self._unfinished_titles())
+        self.assertEqual(['Edited new task'], [task.title for task in inbox.get_tasks(force_reload=True)])
+
+    def test_calendar_to_inbox_moves_many_tasks_in_batches(self):
+        today = datetime.datetime.utcnow().date()
+        for index in range(120):
+            self.fake.add_event('Calendar task {}'.format(index), today)
+        self.fake.add_event('#done Finished task', today)
+        console = self._console()
+        console._inbox.get_tasks()
+        self.fake.reset_counters()
+
+        output = self._run(console, 'ci')
+
+        self.assertIn('120 moved from calendar to inbox, 0 failed', output)
+        self.assertEqual(120, len(self._unfinished_titles()))
+        self.assertTrue(all(event['summary'].startswith('#done') for event in self.fake.events.values()))
+        # one list of events, three batches of inserts, three batches of renames, and two pages of reloading the
+        # inbox because the new tasks are downloaded again
+        self.assertEqual(9, self.fake.http_requests)
+
+    def test_stats_count_the_calls_to_google(self):
+        today = datetime.datetime.utcnow().date()
+        for index in range(60):
+            self.fake.add_event('Calendar task {}'.format(index), today)
+        console = self._console()
+        console._inbox.get_tasks()
+        self.fake.reset_counters()
+        metrics.reset()
+
+        self._run(console, 'ci')
+        output = self._run(console, 'stats')
+
+        self.assertIn('command calendar_to_inbox', output)
+        self.assertIn('tasks.tasks.insert (batch)', output)
+        for api in ('calendar', 'tasks'):
+            calls = sum(path.startswith('/{}/'.format(api)) for _, path in self.fake.calls)
+            self.assertIn('{} API: {} calls'.format(api, calls), output)
+
+    def test_calendar_to_inbox_retries_temporary_errors(self):
+        today = datetime.datetime.utcnow().date()
+        for index in range(10):
+            self.fake.add_event('Calendar task {}'.format(index), today)
+        console = self._console()
+        self.fake.fail_next(503, 3, method='POST')
+        self.fake.fail_next(500, 2, method='PATCH')
+
+        output = self._run(console, 'ci')
+
+        self.assertIn('10 moved from calendar to inbox, 0 failed', output)
+        self.assertEqual(10, len(self._unfinished_titles()))
+
+    def test_calendar_to_inbox_renames_events_of_batches_that_succeeded(self):
+        today = datetime.datetime.utcnow().date()
+        for index in range(120):
+            self.fake.add_event('Calendar task {}'.format(index), today)
+        console = self._console()
+        console._inbox.get_tasks()
+        # the second batch of inserts fails as a whole
+        self.fake.fail_next_batches([None, 400])
+
+        output = self._run(console, 'ci')
+
+        self.assertIn('70 moved from calendar to inbox, 50 failed', output)
+        self.assertEqual(50, output.count('Could not move "Calendar task'))
+        self.assertEqual(70, len(self._unfinished_titles()))
+        self.assertEqual(70, sum(event['summary'].startswith('#done') for event in self.fake.events.values()))
+
+        self._run(console, 'ci')
+        self.assertEqual(120, len(self._unfinished_titles()))
+
+    def test_list_calls_are_retried_after_retry_after(self):
+        self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task')
+        self.fake.fail_next(429, 2, method='GET', retry_after=3)
+        with mock.patch.object(GoogleAPI, '_RETRY_SECONDS', 1000), \
+                mock.patch('productivity.google_api.random.uniform', return_value=0), \
+                mock.patch('productivity.google_api.time.sleep') as sleep:
+            inbox = Inbox()
+            self.assertEqual(['Task'], [task.title for task in inbox.get_tasks()])
+        self.assertEqual([mock.call(3), mock.call(3)], sleep.call_args_list)
+
+    def test_console_reports_errors_of_google(self):
+        console = self._console()
+        console._inbox.get_tasks()
+        self.fake.fail_next(404, method='GET')
+
+        output = self._run(console, 'ic')
+
+        self.assertIn('Could not complete the command', output)
+
+    def test_inbox_to_calendar_schedules_tasks_around_events(self):
+        for index in range(60):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {} #{}min'.format(index, 5 + index % 4 * 5))
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        busy = [(now + datetime.timedelta(hours=hours), now + datetime.timedelta(hours=hours, minutes=45))
+                for hours in range(0, 72, 2)]
+        for start, end in busy:
+            self.fake.add_event('Meeting', start, end)
+        console = self._console()
+        console._inbox.get_tasks()
+        self.fake.reset_counters()
+
+        output = self._run(console, 'ic 7')
+
+        self.assertIn('60 tasks scheduled in calendar', output)
+        planned = [event for event in self.fake.events.values() if event['summary'] != 'Meeting']
+        self.assertEqual(60, len(planned))
+        for event in planned:
+            start = Calendar.string_to_datetime(event['start']['dateTime'])
+            end = Calendar.string_to_datetime(event['end']['dateTime'])
+            for busy_start, busy_end in busy:
+                self.assertFalse(start < pytz.UTC.localize(busy_end) and pytz.UTC.localize(busy_start) < end)
+        # one list of events and two batches of inserts
+        self.assertEqual(3, self.fake.http_requests)
+
+    def test_inbox_to_calendar_plans_around_busy_times_of_all_calendars(self):
+        for index in range(20):
+            self.fake.add_task(GOOGLE_TASKS_INBOX_ID, 'Task {} #30min'.format(index))
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        busy = [(now + datetime.timedelta(hours=hours), now + datetime.timedelta(hours=hours + 1))
+                for hours in range(0, 48)]
+        for start, end in busy[::2]:
+            self.fake.add_event('Meeting', start, end)
+        for start, end in busy[1::2]:
+            self.fake.add_busy_time('work', start, end)
+        console = self._console()
+        console._inbox.get_tasks()
+        console._calendar.schedule_event('All-day task', now)
+        self.fake.reset_counters()
+
+        with mock.patch('productivity.calendar_google.FREE_BUSY_CALENDAR_IDS', ['primary', 'work']):
+            output = self._run(console, 'ic 7')
+
+        self.assertIn('20 tasks scheduled in calendar', output)
+        self.assertIn('transparent', [event.get('transparency') for event in self.fake.events.values()])
+        for event in self.fake.events.values():
+            if event['summary'].startswith('Task'):
+                start = Calendar.string_to_datetime(event['start']['dateTime'])
+                self.assertGreaterEqual(start, pytz.UTC.localize(busy[-1][1]))
+        # one free/busy query instead of listing events, and one batch of inserts
+        self.assertEqual([('POST', '/calendar/v3/freeBusy')],
+                         [call for call in self.fake.calls if call[0] != 'POST' or 'events' not in call[1]])
+
+    def test_busy_times_of_unknown_calendar_value_error(self):
+        now = pytz.UTC.localize(datetime.datetime.utcnow())
+        with self.assertRaises(ValueError):
+            Calendar().busy_times(['primary', 'unknown'], now, now + datetime.timedelta(days=1))
+
+    def _use_other_account(self, account):
+        """
+        Returns: FakeGoogle: the fake of another Google account
+        """
+        fake = FakeGoogle()
+        GoogleAPI.use_transport(fake, account)
+        self.addCleanup(GoogleAPI.use_transport, None, account)
+        patcher = mock.patch('productivity.google_api.ACCOUNTS', {account: 'unused.json'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return fake
+
+    def test_list_shows_google_tasks_lists_of_several_accounts_in_order(self):
+        work = self._use_other_account('work')
+        work.add_task_list('work_inbox')
+        self.fake.add_task_list('someday')
+        for list_id, fake in [(GOOGLE_TASKS_INBOX_ID, self.fake), ('work_inbox', work), ('someday', self.fake)]:
+            for index in range(2):
+                fake.add_task(list_id, '{} {}'.format(list_id, index))
+
+        with mock.patch('productivity.inbox_google.TASK_LISTS',
+                        {'inbox': [GOOGLE_TASKS_INBOX_ID, ('work', 'work_inbox'), 'someday'], 'waiting': ['waiting']}):
+            inbox = Inbox()
+            self.assertEqual([GOOGLE_TASKS_INBOX_ID + ' 0', GOOGLE_TASKS_INBOX_ID + ' 1', 'work_inbox 0',
+                              'work_inbox 1', 'someday 0', 'someday 1'], [task.title for task in inbox.get_tasks()])
+            for _ in range(2):
+                inbox.get_task()
+                inbox.complete_task()
+            inbox.get_task()
+            inbox.edit_task('Edited work task')
+            inbox.new_task('New task')
+            inbox.wait_for_writes()
+
+        self.assertEqual([], inbox.pop_write_errors())
+        self.assertEqual(['New task'], self._unfinished_titles())
+        self.assertEqual(['Edited work task', 'work_inbox 1'], self._unfinished_titles('work_inbox', work))
+
+    def test_lists_are_loaded_at_the_same_time(self):
+        list_ids = ['list{}'.format(index) for index in range(4)]
+        for list_id in list_ids:
+            self.fake.add_task_list(list_id)
+            self.fake.add_task(list_id, 'Task in ' + list_id)
+
+        with mock.patch('productivity.inbox_google.TASK_LISTS', {'inbox': list_ids, 'waiting': ['waiting']}), \
+                mock.patch.object(self.fake, 'latency', 0.2):  # so that the requests of the lists overlap
+            inbox = Inbox()
+            tasks = inbox.get_tasks()
+
+        self.assertEqual(['Task in ' + list_id for list_id in list_ids], [task.title for task in tasks])
+        self.assertGreater(self.fake.max_concurrent_requests, 1)
+
+    def test_busy_times_of_calendars_of_several_accounts(self):
+        work = self._use_other_account('work')
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        self.fake.add_busy_time('colleague', now, now + datetime.timedelta(hours=1))
+        work.add_event('Meeting', now + datetime.timedelta(hours=2), now + datetime.timedelta(hours=3))
+
+        with mock.patch('productivity.calendar_google.FREE_BUSY_CALENDAR_IDS', ['colleague', ('work', 'primary')]):
+            busy = Calendar().busy_times(['colleague', ('work', 'primary')], pytz.UTC.localize(now),
+                                         pytz.UTC.localize(now + datetime.timedelta(days=1)))
+
+        self.assertEqual([60, 60], list(busy.minutes()))
+        self.assertEqual(1, work.http_requests)
+
+    def test_calendar_sync_recovers_from_expired_sync_token(self):
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        self.fake.add_event('Meeting', now, now + datetime.timedelta(hours=1))
+        calendar = Calendar()
+        calendar.sync()
+        self.fake.expire_sync_tokens()
+        self.fake.add_event('Another meeting', now + datetime.timedelta(hours=2), now + datetime.timedelta(hours=3))
+
+        calendar.sync()
+
+        whitespace = calendar.whitespace(pytz.UTC.localize(now), pytz.UTC.localize(now + datetime.timedelta(hours=4)))
+        self.assertEqual(120, whitespace.minutes().sum())
+
+
+if __name__ == '__main__':
+    unittest.main()
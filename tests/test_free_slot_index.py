@@ -0,0 +1,49 @@
+import datetime
+from parameterized import parameterized
+from productivity.datetime_interval import DatetimeInterval
+from productivity.free_slot_index import FreeSlotIndex
+from productivity.interval_set import IntervalSet
+import unittest
+
+TIMES = [datetime.datetime(2000, 1, 1, hour) for hour in range(0, 10)]
+
+
+def _free_slot_index():
+    return FreeSlotIndex(IntervalSet.from_intervals([DatetimeInterval(TIMES[0], TIMES[1]),  # 60 minutes
+                                                     DatetimeInterval(TIMES[2], TIMES[5]),  # 180 minutes
+                                                     DatetimeInterval(TIMES[6], TIMES[8])]))  # 120 minutes
+
+
+class TestFreeSlotIndex(unittest.TestCase):
+    @parameterized.expand([('fits_first', 30, 0),
+                           ('fits_exactly', 60, 0),
+                           ('skips_short_slots', 90, 1),
+                           ('fits_none', 200, None)])
+    def test_first_fit(self, _, minutes, desired_result):
+        self.assertEqual(desired_result, _free_slot_index().first_fit(minutes))
+
+    @parameterized.expand([('one_minute', 1),
+                           ('zero_minutes', 0)])
+    def test_first_fit_empty(self, _, minutes):
+        self.assertIsNone(FreeSlotIndex(IntervalSet.from_intervals([])).first_fit(minutes))
+
+    def test_carve(self):
+        free_slots = _free_slot_index()
+        self.assertEqual((TIMES[2], TIMES[4]), free_slots.carve(1, 120))
+        self.assertEqual(2, free_slots.first_fit(90))
+        self.assertEqual([DatetimeInterval(TIMES[0], TIMES[1]),
+                          DatetimeInterval(TIMES[4], TIMES[5]),
+                          DatetimeInterval(TIMES[6], TIMES[8])], free_slots.to_intervals())
+
+    def test_carve_entire_slot(self):
+        free_slots = _free_slot_index()
+        free_slots.carve(0, 60)
+        self.assertEqual(1, free_slots.first_fit(1))
+
+    def test_carve_value_error(self):
+        with self.assertRaises(ValueError):
+            _free_slot_index().carve(0, 61)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import datetime
+from parameterized import parameterized
+import pytz
+from productivity.datetime_interval import DatetimeInterval
+from productivity.interval_set import IntervalSet
+import unittest
+
+TIMES = [datetime.datetime(2000, 1, day) for day in range(1, 10)]
+
+
+def _interval_set(*index_pairs):
+    return IntervalSet.from_intervals([DatetimeInterval(TIMES[start], TIMES[end]) for start, end in index_pairs])
+
+
+class TestIntervalSet(unittest.TestCase):
+    def test_from_intervals_normalizes(self):
+        interval_set = _interval_set((5, 7), (6, 8), (0, 1), (2, 3), (3, 4))
+        self.assertEqual([DatetimeInterval(TIMES[0], TIMES[1]),
+                          DatetimeInterval(TIMES[2], TIMES[4]),
+                          DatetimeInterval(TIMES[5], TIMES[8])], interval_set.to_intervals())
+
+    def test_empty(self):
+        self.assertFalse(IntervalSet.from_intervals([]))
+        self.assertEqual([], IntervalSet.from_intervals([]).to_intervals())
+
+    def test_mixing_naive_and_aware_value_error(self):
+        with self.assertRaises(ValueError):
+            IntervalSet.from_datetimes([(TIMES[0], TIMES[1]), (pytz.UTC.localize(TIMES[2]), pytz.UTC.localize(TIMES[3]))])
+
+    def test_aware_intervals_are_returned_in_utc(self):
+        amsterdam = pytz.timezone('Europe/Amsterdam')
+        interval_set = IntervalSet.from_datetimes([(amsterdam.localize(TIMES[0]), amsterdam.localize(TIMES[1]))])
+        self.assertEqual([DatetimeInterval(pytz.UTC.localize(TIMES[0]) - datetime.timedelta(hours=1),
+                                           pytz.UTC.localize(TIMES[1]) - datetime.timedelta(hours=1))],
+                         interval_set.to_intervals())
+
+    @parameterized.expand([('disjoint', _interval_set((0, 1)), _interval_set((2, 3)), _interval_set((0, 1), (2, 3))),
+                           ('bordering', _interval_set((0, 1)), _interval_set((1, 2)), _interval_set((0, 2))),
+                           ('overlapping', _interval_set((0, 2)), _interval_set((1, 3)), _interval_set((0, 3))),
+                           ('empty', _interval_set((0, 2)), _interval_set(), _interval_set((0, 2)))])
+    def test_union(self, _, interval_set, other, desired_result):
+        self.assertEqual(desired_result, interval_set.union(other))
+
+    @parameterized.expand([('disjoint', _interval_set((0, 1)), _interval_set((2, 3)), _interval_set()),
+                           ('bordering', _interval_set((0, 1)), _interval_set((1, 2)), _interval_set()),
+                           ('overlapping', _interval_set((0, 2), (3, 6)), _interval_set((1, 4), (5, 8)),
+                            _interval_set((1, 2), (3, 4), (5, 6)))])
+    def test_intersection(self, _, interval_set, other, desired_result):
+        self.assertEqual(desired_result, interval_set.intersection(other))
+
+    @parameterized.expand([('disjoint', _interval_set((0, 1)), _interval_set((2, 3)), _interval_set((0, 1))),
+                           ('inside', _interval_set((0, 8)), _interval_set((1, 2), (3, 4)),
+                            _interval_set((0, 1), (2, 3), (4, 8))),
+                           ('covering', _interval_set((1, 2)), _interval_set((0, 3)), _interval_set()),
+                           ('partially_overlapping', _interval_set((0, 2)), _interval_set((1, 3)), _interval_set((0, 1)))])
+    def test_difference(self, _, interval_set, other, desired_result):
+        self.assertEqual(desired_result, interval_set.difference(other))
+
+    def test_complement(self):
+        self.assertEqual(_interval_set((1, 2), (3, 5)),
+                         _interval_set((0, 1), (2, 3), (5, 8)).complement(TIMES[1], TIMES[6]))
+
+    def test_minutes(self):
+        self.assertEqual([60 * 24, 2 * 60 * 24], _interval_set((0, 1), (2, 4)).minutes().tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
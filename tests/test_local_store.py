@@ -0,0 +1,108 @@
+from productivity.local_store import EventStore, ResponseStore, TaskStore
+import unittest
+from unittest import mock
+
+EVENTS = [('all_day', 'Call the dentist', '2000-01-02', '2000-01-03', None, None),
+          ('timed', 'Meeting', None, None, 100, 200)]
+
+
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.store = EventStore(':memory:')
+        with self.store.transaction():
+            self.store.upsert(EVENTS)
+
+    def test_sync_token(self):
+        self.assertIsNone(self.store.sync_token)
+        with self.store.transaction():
+            self.store.sync_token = 'token'
+        self.assertEqual('token', self.store.sync_token)
+
+    def test_all_day_events(self):
+        self.assertEqual([('all_day', 'Call the dentist')], self.store.all_day_events('2000-01-01', '2000-01-02'))
+        self.assertEqual([], self.store.all_day_events('2000-01-03', '2000-01-04'))
+
+    def test_timed_events(self):
+        self.assertEqual([(100, 200)], self.store.timed_events(150, 300))
+        self.assertEqual([], self.store.timed_events(200, 300))
+
+    def test_upsert_replaces(self):
+        with self.store.transaction():
+            self.store.upsert([('timed', 'Meeting', None, None, 300, 400)])
+        self.assertEqual([(300, 400)], self.store.timed_events(0, 1000))
+
+    def test_delete(self):
+        with self.store.transaction():
+            self.store.delete(['timed'])
+        self.assertEqual([], self.store.timed_events(0, 1000))
+
+    def test_rollback_on_exception(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction():
+                self.store.clear()
+                raise RuntimeError()
+        self.assertEqual([(100, 200)], self.store.timed_events(0, 1000))
+
+
+class TestTaskStore(unittest.TestCase):
+    def setUp(self):
+        self.store = TaskStore(':memory:')
+        with self.store.transaction():
+            self.store.upsert('inbox', [('b', 'Second', '00000000000000000002'),
+                                        ('a', 'First', '00000000000000000001')])
+            self.store.upsert('waiting', [('c', 'Waiting', '00000000000000000001')])
+
+    def test_tasks_in_position_order(self):
+        self.assertEqual([('a', 'First'), ('b', 'Second')], self.store.tasks('inbox'))
+
+    def test_task(self):
+        self.assertEqual(('a', 'First', '00000000000000000001'), self.store.task('inbox', 'a'))
+        self.assertIsNone(self.store.task('waiting', 'a'))
+
+    def test_set_title(self):
+        with self.store.transaction():
+            self.store.set_title('inbox', 'a', 'Edited')
+        self.assertEqual([('a', 'Edited'), ('b', 'Second')], self.store.tasks('inbox'))
+
+    def test_delete(self):
+        with self.store.transaction():
+            self.store.delete('inbox', ['a'])
+        self.assertEqual([('b', 'Second')], self.store.tasks('inbox'))
+
+    def test_clear_only_affects_list(self):
+        with self.store.transaction():
+            self.store.set_updated_min('inbox', '2000-01-01T00:00:00.000Z')
+            self.store.clear('inbox')
+        self.assertEqual([], self.store.tasks('inbox'))
+        self.assertIsNone(self.store.updated_min('inbox'))
+        self.assertEqual([('c', 'Waiting')], self.store.tasks('waiting'))
+
+    def test_clear_keeps_tasks(self):
+        with self.store.transaction():
+            self.store.clear('inbox', keep=['b'])
+        self.assertEqual([('b', 'Second')], self.store.tasks('inbox'))
+
+
+
+class TestResponseStore(unittest.TestCase):
+    def setUp(self):
+        self.store = ResponseStore(':memory:')
+
+    def test_put_replaces(self):
+        self.assertIsNone(self.store.get('uri'))
+        self.store.put('uri', '"1"', {'etag': '"1"', 'items': []})
+        self.store.put('uri', '"2"', {'etag': '"2"', 'items': [{'id': 'a'}]})
+        self.assertEqual(('"2"', {'etag': '"2"', 'items': [{'id': 'a'}]}), self.store.get('uri'))
+        self.assertEqual('"2"', self.store.etag('uri'))
+        self.assertIsNone(self.store.etag('other uri'))
+
+    @mock.patch.object(ResponseStore, '_MAX_RESPONSES', 2)
+    def test_only_recent_responses_are_kept(self):
+        for uri in ['first', 'second', 'third']:
+            self.store.put(uri, '"1"', {})
+        self.assertEqual([None, '"1"', '"1"'],
+                         [(self.store.get(uri) or [None])[0] for uri in ['first', 'second', 'third']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import os
+from parameterized import parameterized
+from productivity.metrics import Metrics
+import tempfile
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+    def test_record_accumulates_per_name(self):
+        metrics = Metrics()
+        metrics.record('tasks.tasks.list', 0.2, bytes_sent=10, bytes_received=1000, calls=1)
+        metrics.record('tasks.tasks.list', 0.4, bytes_received=500, calls=1, error=True)
+        metrics.record('calendar.events.list', 0.1, calls=1)
+
+        statistics = metrics.snapshot()['tasks.tasks.list']
+        self.assertEqual(2, statistics['count'])
+        self.assertEqual(1, statistics['errors'])
+        self.assertEqual(2, statistics['calls'])
+        self.assertAlmostEqual(0.6, statistics['seconds'])
+        self.assertEqual(10, statistics['bytes_sent'])
+        self.assertEqual(1500, statistics['bytes_received'])
+        self.assertEqual(2, sum(statistics['histogram']))
+
+    @parameterized.expand([('median', 0.5, 0.05),
+                           ('95th', 0.95, 1),
+                           ('slowest', 1, float('inf'))])
+    def test_percentile_is_upper_bound_of_bucket(self, _, fraction, expected):
+        metrics = Metrics()
+        for seconds in [0.03] * 50 + [0.6] * 49 + [20]:
+            metrics.record('name', seconds)
+        self.assertEqual(expected, metrics.percentile('name', fraction))
+
+    def test_percentile_of_unknown_name_is_none(self):
+        self.assertIsNone(Metrics().percentile('name', 0.5))
+
+    def test_measure_records_errors_and_raises(self):
+        metrics = Metrics()
+        with metrics.measure('command'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.measure('command'):
+                raise ValueError()
+        self.assertEqual(2, metrics.snapshot()['command']['count'])
+        self.assertEqual(1, metrics.snapshot()['command']['errors'])
+
+    def test_measurements_are_written_as_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.jsonl')
+            metrics = Metrics(path)
+            metrics.record('tasks.tasks.list', 0.1, calls=1)
+            metrics.record('calendar.events.list', 0.2, calls=1)
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+        self.assertEqual(['tasks.tasks.list', 'calendar.events.list'], [line['name'] for line in lines])
+
+    def test_summary_counts_calls_per_api(self):
+        metrics = Metrics()
+        metrics.record('tasks.tasks.list', 0.1, calls=1)
+        metrics.record('tasks.tasks.insert (batch)', 0.1, calls=50)
+        metrics.record('command inbox_to_calendar', 0.1)
+        summary = metrics.summary()
+        self.assertIn('tasks.tasks.insert (batch)', summary)
+        self.assertIn('tasks API: 51 calls', summary)
+        self.assertNotIn('command API', summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
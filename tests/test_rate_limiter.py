@@ -0,0 +1,58 @@
+from productivity.rate_limiter import TokenBucket
+import unittest
+from unittest import mock
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('productivity.rate_limiter.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_does_not_wait(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        self.assertEqual([0] * 5, [bucket.acquire() for _ in range(5)])
+
+    def test_waits_for_tokens_after_burst(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertAlmostEqual(0.1, bucket.acquire())
+        self.assertAlmostEqual(0.1, bucket.acquire())
+
+    def test_tokens_are_added_up_to_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        for _ in range(5):
+            bucket.acquire()
+        self.clock.now += 60
+        self.assertEqual(0, bucket.acquire(5))
+        self.assertAlmostEqual(0.1, bucket.acquire())
+
+    def test_acquiring_more_than_capacity_waits(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        self.assertAlmostEqual(4.5, bucket.acquire(50))
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=10, capacity=5)
+        bucket.pause(2)
+        self.assertAlmostEqual(2.1, bucket.acquire())
+
+    def test_invalid_rate_value_error(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
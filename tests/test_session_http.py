@@ -0,0 +1,81 @@
+import gzip
+import http.server
+import json
+import threading
+from google.auth.credentials import AnonymousCredentials
+from productivity.google_api import _MeteredHttp
+from productivity.session_http import SessionHttp
+import unittest
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keeps connections alive
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        self.server.client_ports.add(self.client_address[1])
+        self.server.request_headers = self.headers
+        content = gzip.compress(json.dumps({'path': self.path, 'body': body.decode('utf-8')}).encode('utf-8'))
+        self.send_response(201)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-encoding', 'gzip')
+        self.send_header('content-length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSessionHttp(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.uri = 'http://127.0.0.1:{}/'.format(self.server.server_address[1])
+        self.http = SessionHttp(AnonymousCredentials(), pool_size=4)
+        self.addCleanup(self.http.close)
+
+    def test_response_like_httplib2(self):
+        response, content = self.http.request(self.uri + 'path', 'POST', body='{"title": "Tâche"}',
+                                              headers={'content-type': 'application/json'})
+        self.assertEqual(201, response.status)
+        self.assertEqual('application/json', response['content-type'])
+        self.assertNotIn('content-encoding', response)
+        self.assertEqual({'path': '/path', 'body': '{"title": "Tâche"}'}, json.loads(content))
+
+    def test_metered_bytes_received_are_compressed_bytes(self):
+        metered_http = _MeteredHttp(self.http)
+        response, content = metered_http.request(self.uri + 'path', 'POST', body='x' * 1000)
+        self.assertEqual(int(response['content-length']), metered_http.bytes_received)
+        self.assertLess(metered_http.bytes_received, len(content))
+
+    def test_compressed_response_is_asked_for(self):
+        self.http.request(self.uri + 'batch', 'POST', body='--batch--', headers={'content-type': 'multipart/mixed'})
+        self.assertIn('gzip', self.server.request_headers['accept-encoding'])
+        self.assertIn('gzip', self.server.request_headers['user-agent'])
+
+    def test_connection_is_reused(self):
+        for _ in range(5):
+            self.http.request(self.uri, 'POST', body='{}')
+        self.assertEqual(1, len(self.server.client_ports))
+
+    def test_threads_share_the_pool(self):
+        statuses = []
+
+        def call():
+            for _ in range(10):
+                statuses.append(self.http.request(self.uri, 'POST', body='{}')[0].status)
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([201] * 80, statuses)
+        self.assertLessEqual(len(self.server.client_ports), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
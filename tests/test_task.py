@@ -0,0 +1,37 @@
+from parameterized import parameterized
+from productivity.config import DEFAULT_TASK_LENGTH
+from productivity.task import Task
+import unittest
+
+
+class TestTask(unittest.TestCase):
+    def test_tags(self):
+        self.assertEqual(['#home', '#15min'], Task('1', 'Clean up #Home #15min').tags())
+
+    @parameterized.expand([('default', 'Clean up', DEFAULT_TASK_LENGTH),
+                           ('hashtag', 'Clean up #15min', 15),
+                           ('hashtag_in_word', 'Clean up #15minutes', DEFAULT_TASK_LENGTH)])
+    def test_minutes(self, _, title, desired_result):
+        self.assertEqual(desired_result, Task('1', title).minutes())
+
+    def test_complete(self):
+        task = Task('1', 'Clean up #15min')
+        self.assertFalse(task.is_done())
+        task.complete()
+        self.assertTrue(task.is_done())
+        self.assertEqual('#done Clean up #15min', task.title)
+
+    def test_changing_title_parses_again(self):
+        task = Task('1', 'Clean up #15min')
+        self.assertEqual(15, task.minutes())
+        task.title = 'Clean up #30min'
+        self.assertEqual(30, task.minutes())
+        self.assertEqual(['#30min'], task.tags())
+
+    def test_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            Task('1', 'Clean up').unknown_attribute = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+from productivity.task import Task
+from productivity.task_list import TaskList
+import unittest
+
+TASKS = [Task('a', 'First'), Task('b', 'Second'), Task('c', 'Third')]
+
+
+class TestTaskList(unittest.TestCase):
+    def test_order(self):
+        self.assertEqual(['a', 'b', 'c'], [task.ID for task in TaskList(TASKS)])
+
+    def test_first_unskipped(self):
+        self.assertEqual('a', TaskList(TASKS).first_unskipped().ID)
+        self.assertEqual('c', TaskList(TASKS, skipped_ids={'a', 'b'}).first_unskipped().ID)
+        self.assertIsNone(TaskList(TASKS, skipped_ids={'a', 'b', 'c'}).first_unskipped())
+        self.assertIsNone(TaskList().first_unskipped())
+
+    def test_skip(self):
+        task_list = TaskList(TASKS)
+        task_list.skip('a')
+        self.assertEqual('b', task_list.first_unskipped().ID)
+        self.assertEqual(3, len(task_list))
+
+    def test_remove(self):
+        task_list = TaskList(TASKS)
+        task_list.remove('a')
+        self.assertEqual('b', task_list.first_unskipped().ID)
+        self.assertNotIn('a', task_list)
+
+    def test_append(self):
+        task_list = TaskList(TASKS, skipped_ids={'a', 'b', 'c'})
+        task_list.append(Task('d', 'Fourth'))
+        self.assertEqual('d', task_list.first_unskipped().ID)
+
+    def test_rename(self):
+        task_list = TaskList(TASKS, skipped_ids={'a'})
+        task_list.rename('a', 'x')
+        task_list.rename('b', 'y')
+        self.assertEqual(['c', 'x', 'y'], list(task_list._tasks))
+        self.assertEqual('c', task_list.first_unskipped().ID)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import threading
+from productivity.write_queue import WriteBehindQueue
+import unittest
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = WriteBehindQueue()
+        self.executed = []
+        self.gate = threading.Event()
+
+    def _run(self, name):
+        def run(body):
+            self.gate.wait()
+            self.executed.append((name, body))
+            return body
+        return run
+
+    def test_executes_in_order(self):
+        self.queue.submit(self._run('first'), {})
+        self.queue.submit(self._run('second'), {})
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual(['first', 'second'], [name for name, _ in self.executed])
+
+    def test_coalesces_waiting_operations_with_the_same_key(self):
+        self.queue.submit(self._run('blocking'), {})
+        self.queue.submit(self._run('edit'), {'title': 'Edited'}, key='task')
+        self.queue.submit(self._run('complete'), {'status': 'completed'}, key='task')
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual([('blocking', {}), ('edit', {'title': 'Edited', 'status': 'completed'})], self.executed)
+
+    def test_does_not_coalesce_across_other_operations(self):
+        self.queue.submit(self._run('blocking'), {})
+        self.queue.submit(self._run('edit'), {'title': 'Edited'}, key='task')
+        self.queue.submit(self._run('insert'), {'title': 'Edited'}, key='other task')
+        self.queue.submit(self._run('complete'), {'status': 'completed'}, key='task')
+        self.queue.submit(self._run('edit again'), {'title': 'Edited again'}, key='task')
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual([('blocking', {}), ('edit', {'title': 'Edited'}), ('insert', {'title': 'Edited'}),
+                          ('complete', {'status': 'completed', 'title': 'Edited again'})], self.executed)
+
+    def test_on_success(self):
+        responses = []
+        self.queue.submit(self._run('blocking'), {})
+        self.queue.submit(self._run('edit'), {'title': 'Edited'}, key='task', on_success=responses.append)
+        self.queue.submit(self._run('complete'), {'status': 'completed'}, key='task', on_success=responses.append)
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual(2 * [{'title': 'Edited', 'status': 'completed'}], responses)
+
+    def test_does_not_retry_errors(self):
+        attempts = []
+        error = ConnectionError('temporary')
+
+        def run(body):
+            attempts.append(body)
+            raise error
+        self.queue.submit(run, {}, description='fail')
+        self.queue.flush()
+        self.assertEqual(1, len(attempts))  # the run function retries temporary errors itself
+        self.assertEqual([('fail', error)], self.queue.pop_errors())
+
+    def test_on_error_of_coalesced_operations_in_reverse_order(self):
+        undone = []
+
+        def fail(body):
+            raise ValueError('permanent')
+        self.queue.submit(self._run('blocking'), {})
+        self.queue.submit(fail, {'title': 'Edited'}, key='task', on_error=lambda error: undone.append('edit'))
+        self.queue.submit(fail, {'status': 'completed'}, key='task', on_error=lambda error: undone.append('complete'))
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual(['complete', 'edit'], undone)
+        self.assertEqual(1, len(self.queue.pop_errors()))
+
+    def test_reports_errors(self):
+        error = ValueError('permanent')
+
+        def run(body):
+            raise error
+        self.queue.submit(run, {}, description='fail')
+        self.queue.submit(self._run('next'), {})
+        self.gate.set()
+        self.queue.flush()
+        self.assertEqual([('fail', error)], self.queue.pop_errors())
+        self.assertEqual([], self.queue.pop_errors())
+        self.assertEqual(['next'], [name for name, _ in self.executed])
+
+
+if __name__ == '__main__':
+    unittest.main()